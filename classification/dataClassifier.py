@@ -17,6 +17,7 @@
 import math
 import sys
 
+import featureMatrix
 import mira
 import mostFrequent
 import naiveBayes
@@ -64,6 +65,41 @@ def basicFeatureExtractorFace(datum):
                 features[(x,y)] = 0
     return features
 
+def basicFeatureMatrixDigit(data):
+    """
+    basicFeatureExtractorDigit for a whole list of data, written straight
+    into a uint8 featureMatrix.FeatureMatrix
+    """
+    return featureMatrix.pixelFeatureMatrix(data, DIGIT_DATUM_WIDTH, DIGIT_DATUM_HEIGHT)
+
+def basicFeatureMatrixFace(data):
+    """
+    basicFeatureExtractorFace for a whole list of data, written straight
+    into a uint8 featureMatrix.FeatureMatrix
+    """
+    return featureMatrix.pixelFeatureMatrix(data, FACE_DATUM_WIDTH, FACE_DATUM_HEIGHT)
+
+MATRIX_FEATURE_FUNCTIONS = {
+    basicFeatureExtractorDigit: basicFeatureMatrixDigit,
+    basicFeatureExtractorFace: basicFeatureMatrixFace,
+}
+
+def extractFeatureMatrices(featureFunction, rawTrainingData, rawValidationData, rawTestData):
+    """
+    Returns the training, validation and test features as FeatureMatrix
+    objects.  The basic extractors have matrix versions; the Counters of
+    any other extractor are packed into matrices with the columns of the
+    training features.
+    """
+    if featureFunction in MATRIX_FEATURE_FUNCTIONS:
+        matrixFunction = MATRIX_FEATURE_FUNCTIONS[featureFunction]
+        return matrixFunction(rawTrainingData), matrixFunction(rawValidationData), matrixFunction(rawTestData)
+    trainingData = featureMatrix.counterFeatureMatrix(map(featureFunction, rawTrainingData))
+    features = trainingData.features
+    return (trainingData,
+            featureMatrix.counterFeatureMatrix(map(featureFunction, rawValidationData), features),
+            featureMatrix.counterFeatureMatrix(map(featureFunction, rawTestData), features))
+
 def enhancedFeatureExtractorDigit(datum):
     """
     Your feature extraction playground.
@@ -385,6 +421,15 @@ USAGE_STRING = """
                   on the faces dataset, would use the smoothing parameter equals to 2.5, would
                   test the classifier on the test data and performs an odd ratio analysis
                   with label1=3 vs. label2=6
+              (3) python dataClassifier.py -c perceptron -t 5000 -m
+                  - would train the perceptron on all 5000 training digits,
+                  with their features extracted into a numpy matrix
+              (4) python dataClassifier.py -c mira -t 1000 -a -j 3
+                  - would train MIRA with each of its three candidate values of C
+                  in a separate process and keep the one with the best validation accuracy
+              (5) python dataClassifier.py -c perceptron -t 5000 -i 20 --averaged
+                  - would train an averaged perceptron for up to 20 iterations, stopping
+                  early once the validation accuracy stops improving
                  """
 
 
@@ -406,6 +451,10 @@ def readCommand( argv ):
     parser.add_option('-i', '--iterations', help=default("Maximum iterations to run training"), default=3, type="int")
     parser.add_option('-s', '--test', help=default("Amount of test data to use"), default=TEST_SET_SIZE, type="int")
     parser.add_option('-g', '--agentToClone', help=default("Pacman agent to copy"), default=None, type="str")
+    parser.add_option('-m', '--matrix', help=default("Whether to extract features into numpy matrices instead of Counters"), default=False, action="store_true")
+    parser.add_option('--sparse', help=default("Whether to train the perceptron with early stopping on the validation data (implies -m)"), default=False, action="store_true")
+    parser.add_option('--averaged', help=default("Whether to average the perceptron weights (implies --sparse)"), default=False, action="store_true")
+    parser.add_option('-j', '--jobs', help=default("Number of processes to evaluate the --autotune candidates in"), default=1, type="int")
 
     options, otherjunk = parser.parse_args(argv)
     if len(otherjunk) != 0: raise Exception('Command line input not understood: ' + str(otherjunk))
@@ -453,11 +502,29 @@ def readCommand( argv ):
     else:
         legalLabels = ['Stop', 'West', 'East', 'North', 'South']
 
+    if options.matrix and (options.data == 'pacman' or featureMatrix.numpy is None):
+        print "Feature matrices need numpy and the digits or faces dataset"
+        print USAGE_STRING
+        sys.exit(2)
+
+    if (options.sparse or options.averaged) and (options.classifier != 'perceptron' or options.data == 'pacman' or featureMatrix.numpy is None):
+        print "Sparse and averaged training need numpy, the perceptron and the digits or faces dataset"
+        print USAGE_STRING
+        sys.exit(2)
+    if options.sparse or options.averaged:
+        # Packing the Counters into a matrix costs more than training does
+        options.matrix = True
+
     if options.training <= 0:
         print "Training set size should be a positive integer (you provided: %d)" % options.training
         print USAGE_STRING
         sys.exit(2)
 
+    if options.jobs <= 0:
+        print "Number of jobs should be a positive integer (you provided: %d)" % options.jobs
+        print USAGE_STRING
+        sys.exit(2)
+
     if options.smoothing <= 0:
         print "Please provide a positive number for smoothing (you provided: %f)" % options.smoothing
         print USAGE_STRING
@@ -477,11 +544,14 @@ def readCommand( argv ):
         if (options.autotune):
             print "using automatic tuning for naivebayes"
             classifier.automaticTuning = True
+            classifier.jobs = options.jobs
         else:
             print "using smoothing parameter k=%f for naivebayes" %  options.smoothing
     elif(options.classifier == "perceptron"):
         if options.data != 'pacman':
             classifier = perceptron.PerceptronClassifier(legalLabels,options.iterations)
+            classifier.sparse = options.sparse or options.averaged
+            classifier.averaged = options.averaged
         else:
             classifier = perceptron_pacman.PerceptronClassifierPacman(legalLabels,options.iterations)
     elif(options.classifier == "mira"):
@@ -490,6 +560,7 @@ def readCommand( argv ):
         if (options.autotune):
             print "using automatic tuning for MIRA"
             classifier.automaticTuning = True
+            classifier.jobs = options.jobs
         else:
             print "using default C=0.001 for MIRA"
     elif(options.classifier == 'minicontest'):
@@ -562,13 +633,20 @@ def runClassifier(args, options):
 
     # Extract features
     print "Extracting features..."
-    trainingData = map(featureFunction, rawTrainingData)
-    validationData = map(featureFunction, rawValidationData)
-    testData = map(featureFunction, rawTestData)
+    if options.matrix:
+        trainingData, validationData, testData = extractFeatureMatrices(featureFunction, rawTrainingData,
+                                                                        rawValidationData, rawTestData)
+    else:
+        trainingData = map(featureFunction, rawTrainingData)
+        validationData = map(featureFunction, rawValidationData)
+        testData = map(featureFunction, rawTestData)
 
     # Conduct training and testing
     print "Training..."
     classifier.train(trainingData, trainingLabels, validationData, validationLabels)
+    if options.jobs > 1:
+        for result in getattr(classifier, 'tuningResults', []):
+            print "Trained and validated candidate %s in %.2f seconds" % (result['candidate'], result['time'])
     print "Validating..."
     guesses = classifier.classify(validationData)
     correct = [guesses[i] == validationLabels[i] for i in range(len(validationLabels))].count(True)
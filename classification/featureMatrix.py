@@ -0,0 +1,125 @@
+# featureMatrix.py
+# ----------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+# Dense feature matrices: the features of a whole data set as one numpy
+# array instead of a list of util.Counters, for the classifiers' matrix paths
+import util
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class FeatureMatrix:
+    """
+    The features of a list of data as the rows of a numpy matrix with one
+    column per feature.  features lists the feature keys in column order
+    and featureIndex maps a key back to its column, so a trained
+    classifier can still report its weights by feature.
+
+    len() and indexing give the number of data and each datum as a
+    util.Counter, like the lists of Counters the classifiers also take.
+    """
+    def __init__(self, matrix, features):
+        self.matrix = matrix
+        self.features = features
+        self.featureIndex = dict((feature, column) for column, feature in enumerate(features))
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def __getitem__(self, row):
+        datum = util.Counter()
+        for feature, value in zip(self.features, self.matrix[row].tolist()):
+            datum[feature] = value
+        return datum
+
+    def __iter__(self):
+        return (self[row] for row in range(len(self)))
+
+
+def pixelFeatureMatrix(data, width, height):
+    """
+    Returns a uint8 FeatureMatrix of the samples.Datum objects in data whose
+    column x * height + y is 1 when pixel (x, y) is not blank: the (x, y)
+    features of basicFeatureExtractorDigit and basicFeatureExtractorFace,
+    read without building a Counter per datum.
+    """
+    matrix = numpy.zeros((len(data), width * height), dtype=numpy.uint8)
+    for row, datum in enumerate(data):
+        # Datum pixels are columns; faces are taller than wide, which
+        # leaves empty lists past the last column
+        pixels = numpy.array(datum.getPixels()[:width], dtype=numpy.uint8)
+        matrix[row] = pixels.ravel() > 0
+    return FeatureMatrix(matrix, [(x, y) for x in range(width) for y in range(height)])
+
+
+def counterFeatureMatrix(data, features=None, dtype=None):
+    """
+    Packs a list of feature Counters into a FeatureMatrix (float32 unless
+    dtype says otherwise).  The columns are the given features or, by
+    default, every key of data in the order first seen; keys of data that
+    are not among the features are dropped, and missing ones read as 0.
+    Pass a training matrix's features when packing its validation and test
+    data so the columns line up.
+    """
+    if features is None:
+        features, seen = [], set()
+        for datum in data:
+            for feature in datum:
+                if feature not in seen:
+                    seen.add(feature)
+                    features.append(feature)
+    matrix = FeatureMatrix(numpy.zeros((len(data), len(features)), dtype=dtype or numpy.float32), features)
+    featureIndex = matrix.featureIndex
+    for row, datum in enumerate(data):
+        columns, values = [], []
+        for feature, value in datum.items():
+            if feature in featureIndex:
+                columns.append(featureIndex[feature])
+                values.append(value)
+        matrix.matrix[row, columns] = values
+    return matrix
+
+
+def labelOrder(labels):
+    """
+    Returns labels in the order util.Counter.argMax breaks ties between them,
+    so that numpy's argmax over rows kept in this order picks the same label.
+    """
+    counter = util.Counter()
+    for label in labels:
+        counter[label] = 0
+    return counter.keys()
+
+
+def weightMatrix(weights, features, labels):
+    "Returns a dict of weight Counters keyed by label as a labels x features float array"
+    matrix = numpy.zeros((len(labels), len(features)))
+    for row, label in enumerate(labels):
+        labelWeights = weights[label]
+        if labelWeights:
+            matrix[row] = [labelWeights[feature] for feature in features]
+    return matrix
+
+
+def weightCounters(matrix, features, labels):
+    "Returns a labels x features weight array as a dict of Counters keyed by label"
+    weights = {}
+    for label, row in zip(labels, matrix.tolist()):
+        weights[label] = util.Counter()
+        for feature, weight in zip(features, row):
+            weights[label][feature] = weight
+    return weights
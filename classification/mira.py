@@ -14,6 +14,8 @@
 
 # Mira implementation
 import util
+import tuning
+from featureMatrix import FeatureMatrix, labelOrder, weightMatrix, weightCounters
 
 PRINT = True
 
@@ -33,6 +35,7 @@ class MiraClassifier:
         self.C = 0.001
         self.legalLabels = legalLabels
         self.max_iterations = max_iterations
+        self.jobs = 1 # number of processes to train the values of C in
         self.initializeWeightsToZero()
 
     def initializeWeightsToZero(self):
@@ -44,7 +47,10 @@ class MiraClassifier:
     def train(self, trainingData, trainingLabels, validationData, validationLabels):
         "Outside shell to call your method. Do not modify this method."
 
-        self.features = trainingData[0].keys()  # this could be useful for your code later...
+        if isinstance(trainingData, FeatureMatrix):
+            self.features = trainingData.features
+        else:
+            self.features = trainingData[0].keys()  # this could be useful for your code later...
 
         if (self.automaticTuning):
             caps = [0.002, 0.004, 0.008]
@@ -64,33 +70,76 @@ class MiraClassifier:
         representing a vector of values.
         """
 
-        weightsPerCap = self.trainWeights(caps, trainingData, trainingLabels)
-        accuracies = self.getAccuracies(weightsPerCap, validationData, validationLabels)
+        weightsPerCap = self.trainWeights(caps, trainingData, trainingLabels, validationData, validationLabels)
+        accuracies = self.getAccuracies(weightsPerCap)
 
         # Set the weights of the best cap
         self.weights = weightsPerCap[accuracies.argMax()]
 
-    def trainWeights(self, caps, trainingData, trainingLabels):
-        weightsPerCap = dict()
-        for cap in caps:
+    def trainWeights(self, caps, trainingData, trainingLabels, validationData, validationLabels):
+        """
+        Trains the weights of each cap and measures their accuracy on the
+        validation data, self.jobs caps at a time (see tuning.tuneCandidates).
+        Returns the weights by cap; self.tuningResults gets the result of
+        each cap, with its accuracy and training time.
+        """
+        def evaluate(cap):
             print "Starting training for c = ", str(cap)
-            for iteration in range(self.max_iterations):
-                self.doIteration(cap, iteration, trainingData, trainingLabels)
-            weightsPerCap[cap] = self.weights
             self.initializeWeightsToZero()
+            if isinstance(trainingData, FeatureMatrix):
+                self.trainMatrix(cap, trainingData, trainingLabels)
+            else:
+                for iteration in range(self.max_iterations):
+                    self.doIteration(cap, iteration, trainingData, trainingLabels)
+            return self.weights, self.getAccuracy(validationData, validationLabels)
+
+        weightsPerCap = dict()
+        self.tuningResults = []
+        for result in tuning.tuneCandidates(evaluate, caps, self.jobs):
+            weightsPerCap[result['candidate']] = result['model']
+            self.tuningResults.append(result)
+        self.initializeWeightsToZero()
         return weightsPerCap
 
-    def getAccuracies(self, weightsPerCap, validationData, validationLabels):
+    def trainMatrix(self, ceiling, trainingData, trainingLabels):
+        """
+        The iterations of one cap for a FeatureMatrix: the same updates as
+        processInstance, on a labels x features weight array.  The weights
+        end up as Counters again.
+        """
+        labels = labelOrder(self.legalLabels)
+        rows = [labels.index(label) for label in trainingLabels]
+        weights = weightMatrix(self.weights, trainingData.features, labels)
+        data = trainingData.matrix.astype(float)
+        for iteration in range(self.max_iterations):
+            print "Starting iteration ", iteration
+            for features, label in zip(data, rows):
+                guessedLabel = weights.dot(features).argmax()
+                if guessedLabel != label:
+                    dividend = (weights[guessedLabel] - weights[label]).dot(features) + 1.0
+                    divisor = 2 * float(features.dot(features))
+                    scaledFeatures = min(ceiling, dividend / divisor) * features
+                    weights[label] += scaledFeatures
+                    weights[guessedLabel] -= scaledFeatures
+        self.weights = weightCounters(weights, trainingData.features, labels)
+
+    def getAccuracies(self, weightsPerCap):
+        "Returns the validation accuracy of each cap in weightsPerCap, as measured by trainWeights"
+        accuracyPerCap = dict((result['candidate'], result['accuracy']) for result in self.tuningResults)
         accuracies = util.Counter()
-        for cap, weights in weightsPerCap.iteritems():
-            self.weights = weights
-            accuracy = self.getAccuracy(validationData, validationLabels)
+        for cap in weightsPerCap:
+            accuracy = accuracyPerCap[cap]
             print "Accuracy on validation set for c = ", str(cap), ": ", str(accuracy)
             accuracies[cap] = accuracy
 
         return accuracies
 
     def getAccuracy(self, validationData, validationLabels):
+        if isinstance(validationData, FeatureMatrix):
+            guesses = self.classify(validationData)
+            numberCorrect = [guesses[i] == validationLabels[i] for i in range(len(validationLabels))].count(True)
+            return float(numberCorrect) / float(len(validationData))
+
         numberCorrect = 0
         for i in range(len(validationData)):
             guessedLabel = self.guessLabel(validationData[i])
@@ -149,6 +198,11 @@ class MiraClassifier:
 
         Recall that a datum is a util.counter...
         """
+        if isinstance(data, FeatureMatrix):
+            labels = labelOrder(self.legalLabels)
+            weights = weightMatrix(self.weights, data.features, labels)
+            return [labels[row] for row in data.matrix.dot(weights.T).argmax(1)]
+
         guesses = []
         for datum in data:
             vectors = util.Counter()
@@ -15,6 +15,13 @@
 import util
 import classificationMethod
 import math
+import tuning
+from featureMatrix import FeatureMatrix, labelOrder
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 class NaiveBayesClassifier(classificationMethod.ClassificationMethod):
     """
@@ -28,6 +35,8 @@ class NaiveBayesClassifier(classificationMethod.ClassificationMethod):
         self.type = "naivebayes"
         self.k = 1 # this is the smoothing parameter, ** use it in your train method **
         self.automaticTuning = False # Look at this flag to decide whether to choose k automatically ** use this in your train method **
+        self.labels = labelOrder(legalLabels) # order of the rows of the estimate arrays
+        self.jobs = 1 # number of processes to evaluate the values of k in
 
     def setSmoothing(self, k):
         """
@@ -43,14 +52,20 @@ class NaiveBayesClassifier(classificationMethod.ClassificationMethod):
 
         # might be useful in your code later...
         # this is a list of all features in the training set.
-        self.features = list(set([ f for datum in trainingData for f in datum.keys() ]));
+        if isinstance(trainingData, FeatureMatrix):
+            self.features = trainingData.features
+        else:
+            self.features = list(set([ f for datum in trainingData for f in datum.keys() ]));
 
         if (self.automaticTuning):
             kgrid = [0.001, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 20, 50]
         else:
             kgrid = [self.k]
 
-        self.trainAndTune(trainingData, trainingLabels, validationData, validationLabels, kgrid)
+        if numpy is None:
+            self.trainAndTuneCounters(trainingData, trainingLabels, validationData, validationLabels, kgrid)
+        else:
+            self.trainAndTune(trainingData, trainingLabels, validationData, validationLabels, kgrid)
 
     def trainAndTune(self, trainingData, trainingLabels, validationData, validationLabels, kgrid):
         """
@@ -59,14 +74,150 @@ class NaiveBayesClassifier(classificationMethod.ClassificationMethod):
         Evaluate each value of k in kgrid to choose the smoothing parameter
         that gives the best accuracy on the held-out validationData.
 
-        trainingData and validationData are lists of feature Counters.  The corresponding
-        label lists contain the correct label for each datum.
+        trainingData and validationData are lists of feature Counters or
+        FeatureMatrix objects.  The corresponding label lists contain the
+        correct label for each datum.
 
-        To get the list of all possible features or labels, use self.features and
-        self.legalLabels.
+        The counts are labels x features arrays collected once (see
+        countFeatures); each k smooths them all at once, and the validation
+        data is classified by a matrix product with the log tables of the
+        estimates (see setEstimates).  The chosen estimates are also stored
+        as the self.prior and self.conditionalProb Counters.  The values of
+        k are evaluated by self.jobs processes (see tune).
         """
+        labelCounts, seenCounts, activeCounts = self.countFeatures(trainingData, trainingLabels)
+        validationArrays = self.getFeatureArrays(validationData)
+
+        def evaluate(k):
+            prior = labelCounts / labelCounts.sum()
+            conditionalProb = (activeCounts + k) / (seenCounts + 2 * k)
+            self.setEstimates(prior, conditionalProb)
+
+            # evaluating performance on validation set
+            logJoints = self.calculateLogJointProbabilityArray(*validationArrays)
+            predictions = [posterior.argMax() for posterior in self.getPosteriors(logJoints)]
+            accuracyCount =  [predictions[i] == validationLabels[i] for i in range(len(validationLabels))].count(True)
+            return (prior, conditionalProb), accuracyCount
 
+        prior, conditionalProb = self.tune(evaluate, kgrid, len(validationLabels))
+        self.setEstimates(prior, conditionalProb)
+
+        self.prior = util.Counter()
+        self.conditionalProb = util.Counter()
+        for row, label in enumerate(self.labels):
+            self.prior[label] = prior[row]
+            for feat, prob in zip(self.features, conditionalProb[row].tolist()):
+                self.conditionalProb[feat, label] = prob
+
+    def tune(self, evaluate, kgrid, numValidation):
+        """
+        Evaluates each value of k in kgrid with evaluate(k), which returns
+        the estimates trained with it and how many validation data they
+        classify correctly, and returns the estimates of the first best k.
+        Sets self.k to it and self.tuningResults to the results of every k
+        (see tuning.tuneCandidates).
+        """
         bestAccuracyCount = -1 # best accuracy so far on validation set
+        self.tuningResults = []
+        for result in tuning.tuneCandidates(evaluate, kgrid, self.jobs):
+            k, accuracyCount = result['candidate'], result['accuracy']
+            print "Performance on validation set for k=%f: (%.1f%%)" % (k, 100.0*accuracyCount/numValidation)
+            if accuracyCount > bestAccuracyCount:
+                bestParams, self.k = result['model'], k
+                bestAccuracyCount = accuracyCount
+            self.tuningResults.append(result)
+            # end of automatic tuning loop
+        return bestParams
+
+    def countFeatures(self, trainingData, trainingLabels):
+        """
+        Returns labels x features arrays of how many training data have each
+        label, how many of them have each feature (whatever its value) and
+        how many have it active, with rows in self.labels order and columns
+        in self.features order.  A FeatureMatrix has every feature of every
+        datum.
+        """
+        labelRows = numpy.array([self.labels.index(label) for label in trainingLabels])
+        labelCounts = numpy.bincount(labelRows, minlength=len(self.labels)).astype(float)
+        activeCounts = numpy.zeros((len(self.labels), len(self.features)))
+        if isinstance(trainingData, FeatureMatrix):
+            for row in range(len(self.labels)):
+                activeCounts[row] = (trainingData.matrix[labelRows == row] > 0).sum(0)
+            return labelCounts, labelCounts[:, None].repeat(len(self.features), 1), activeCounts
+
+        seenCounts = numpy.zeros((len(self.labels), len(self.features)))
+        featureIndex = dict((feat, column) for column, feat in enumerate(self.features))
+        for datum, row in zip(trainingData, labelRows):
+            columns = numpy.array([featureIndex[feat] for feat in datum.keys()], dtype=int)
+            seenCounts[row, columns] += 1
+            activeCounts[row, columns[numpy.array(datum.values()) > 0]] += 1
+        return labelCounts, seenCounts, activeCounts
+
+    def setEstimates(self, prior, conditionalProb):
+        """
+        Uses prior (by label) and conditionalProb (labels x features) arrays
+        of estimates to classify, keeping their logarithms and those of
+        1 - conditionalProb.
+        """
+        self.logPrior = numpy.log(prior)
+        self.logProb = numpy.log(conditionalProb)
+        self.logNotProb = numpy.log(1 - conditionalProb)
+
+    def getFeatureArrays(self, data):
+        """
+        Returns two data x features arrays for a list of Counters or a
+        FeatureMatrix: 1 where the datum has the feature with a value above
+        0, and 1 where it has the feature with a value of 0 or less.  Only
+        the columns of self.features are kept.
+        """
+        active = numpy.zeros((len(data), len(self.features)))
+        inactive = numpy.zeros((len(data), len(self.features)))
+        featureIndex = dict((feat, column) for column, feat in enumerate(self.features))
+        if isinstance(data, FeatureMatrix):
+            pairs = [(featureIndex[feat], column) for column, feat in enumerate(data.features) if feat in featureIndex]
+            columns = [column for column, _ in pairs]
+            values = data.matrix[:, [dataColumn for _, dataColumn in pairs]] > 0
+            active[:, columns] = values
+            inactive[:, columns] = ~values
+            return active, inactive
+
+        for row, datum in enumerate(data):
+            columns = numpy.array([featureIndex.get(feat, -1) for feat in datum.keys()], dtype=int)
+            values = numpy.array(datum.values()) > 0
+            known = columns >= 0
+            active[row, columns[known & values]] = 1
+            inactive[row, columns[known & ~values]] = 1
+        return active, inactive
+
+    def calculateLogJointProbabilityArray(self, active, inactive):
+        """
+        calculateLogJointProbabilities for a whole batch of data given as
+        getFeatureArrays: a data x labels array of log-joints, the log prior
+        plus two matrix products with the log tables.
+        """
+        logJoints = active.dot(self.logProb.T) + inactive.dot(self.logNotProb.T) + self.logPrior
+
+        threshold = 0.55
+        if len(self.labels) == 2 and True in self.labels and False in self.labels:
+            logJoints[:, self.labels.index(False)] *= threshold
+            logJoints[:, self.labels.index(True)] *= (1.0 - threshold)
+
+        return logJoints
+
+    def getPosteriors(self, logJoints):
+        "Turns the rows of a data x labels array of log-joints into Counters keyed by label"
+        posteriors = []
+        for row in logJoints.tolist():
+            posterior = util.Counter()
+            for label, logJoint in zip(self.labels, row):
+                posterior[label] = logJoint
+            posteriors.append(posterior)
+        return posteriors
+
+    def trainAndTuneCounters(self, trainingData, trainingLabels, validationData, validationLabels, kgrid):
+        """
+        trainAndTune without numpy, on util.Counters keyed by (feat, label).
+        """
 
         # Common training - get all counts from training data
         # We only do it once - save computation in tuning smoothing parameter
@@ -85,7 +236,7 @@ class NaiveBayesClassifier(classificationMethod.ClassificationMethod):
                 if value > 0: # assume binary value
                     commonConditionalProb[(feat, label)] += 1
 
-        for k in kgrid: # Smoothing parameter tuning loop!
+        def evaluate(k):
             prior = util.Counter()
             conditionalProb = util.Counter()
             counts = util.Counter()
@@ -116,12 +267,9 @@ class NaiveBayesClassifier(classificationMethod.ClassificationMethod):
             predictions = self.classify(validationData)
             accuracyCount =  [predictions[i] == validationLabels[i] for i in range(len(validationLabels))].count(True)
 
-            print "Performance on validation set for k=%f: (%.1f%%)" % (k, 100.0*accuracyCount/len(validationLabels))
-            if accuracyCount > bestAccuracyCount:
-                bestParams = (prior, conditionalProb, k)
-                bestAccuracyCount = accuracyCount
-            # end of automatic tuning loop
-        self.prior, self.conditionalProb, self.k = bestParams
+            return (prior, conditionalProb), accuracyCount
+
+        self.prior, self.conditionalProb = self.tune(evaluate, kgrid, len(validationLabels))
 
     def classify(self, testData):
         """
@@ -129,6 +277,10 @@ class NaiveBayesClassifier(classificationMethod.ClassificationMethod):
 
         You shouldn't modify this method.
         """
+        if numpy is not None:
+            self.posteriors = self.getPosteriors(self.calculateLogJointProbabilityArray(*self.getFeatureArrays(testData)))
+            return [posterior.argMax() for posterior in self.posteriors]
+
         guesses = []
         self.posteriors = [] # Log posteriors are stored for later data analysis (autograder).
         for datum in testData:
@@ -146,6 +298,9 @@ class NaiveBayesClassifier(classificationMethod.ClassificationMethod):
         To get the list of all possible features or labels, use self.features and
         self.legalLabels.
         """
+        if numpy is not None:
+            return self.getPosteriors(self.calculateLogJointProbabilityArray(*self.getFeatureArrays([datum])))[0]
+
         logJoint = util.Counter()
 
         for label in self.legalLabels:
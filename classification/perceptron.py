@@ -14,6 +14,12 @@
 
 # Perceptron implementation
 import util
+from featureMatrix import FeatureMatrix, counterFeatureMatrix, labelOrder, weightMatrix, weightCounters
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 PRINT = True
 
@@ -30,6 +36,9 @@ class PerceptronClassifier:
         self.legalLabels = legalLabels
         self.type = "perceptron"
         self.max_iterations = max_iterations
+        self.sparse = False # train with trainSparse
+        self.averaged = False # whether trainSparse averages the weights
+        self.patience = 2 # iterations trainSparse waits for the validation accuracy to improve
         self.weights = {}
         for label in legalLabels:
             self.weights[label] = util.Counter()
@@ -50,9 +59,105 @@ class PerceptronClassifier:
         (and thus represents a vector a values).
         """
 
+        if self.sparse:
+            return self.trainSparse(trainingData, trainingLabels, validationData, validationLabels)
+
+        if isinstance(trainingData, FeatureMatrix):
+            return self.trainMatrix(trainingData, trainingLabels)
+
         for iteration in range(self.max_iterations):
             self.doIteration(iteration, trainingData, trainingLabels)
 
+    def trainMatrix(self, trainingData, trainingLabels):
+        """
+        train for a FeatureMatrix: the same passes and updates, on a labels x
+        features weight array.  The weights end up as Counters again.
+        """
+        labels = labelOrder(self.legalLabels)
+        rows = [labels.index(label) for label in trainingLabels]
+        weights = weightMatrix(self.weights, trainingData.features, labels)
+        data = trainingData.matrix.astype(float)
+        for iteration in range(self.max_iterations):
+            print "Starting iteration ", iteration, "..."
+            for features, label in zip(data, rows):
+                guessedLabel = weights.dot(features).argmax()
+                if guessedLabel != label:
+                    weights[label] += features
+                    weights[guessedLabel] -= features
+        self.weights = weightCounters(weights, trainingData.features, labels)
+
+    def trainSparse(self, trainingData, trainingLabels, validationData, validationLabels):
+        """
+        The early-stopping, optionally averaged version of train (needs
+        numpy), for FeatureMatrix objects or lists of Counters, which are
+        packed into one first at some cost.  The weights are one array, and
+        each datum is scored and updated on the weights of its active
+        features only.  On the dense pixel features of the digits and faces
+        this is no faster than trainMatrix; it is here for the averaging
+        and the early stopping.
+
+        With self.averaged, the weights kept are the average of the weights
+        after every datum of every iteration.  The average is kept lazily:
+        each update is also added to a second array, scaled by the number
+        of data seen so far, and the average is recovered from the two
+        arrays when needed.
+
+        Training stops early after an iteration without mistakes, or when
+        the accuracy on the validation data has not improved for
+        self.patience iterations; the weights of the best iteration are kept.
+        """
+        if not isinstance(trainingData, FeatureMatrix):
+            trainingData = counterFeatureMatrix(trainingData)
+        if not isinstance(validationData, FeatureMatrix) or validationData.features != trainingData.features:
+            validationData = counterFeatureMatrix(list(validationData), trainingData.features)
+
+        labels = labelOrder(self.legalLabels)
+        rows = [labels.index(label) for label in trainingLabels]
+        validationRows = numpy.array([labels.index(label) for label in validationLabels])
+        # features x labels, so that the weights of a datum's features are rows
+        weights = weightMatrix(self.weights, trainingData.features, labels).T.copy()
+        updateSums = numpy.zeros(weights.shape) # each update times the number of data seen before it
+        seen = 1
+
+        data = []
+        for features in trainingData.matrix:
+            columns = numpy.flatnonzero(features)
+            data.append((columns, features[columns].astype(float)))
+
+        bestAccuracy, bestWeights, bestIteration = -1, weights, -1
+        for iteration in range(self.max_iterations):
+            mistakes = 0
+            for (columns, values), label in zip(data, rows):
+                activeWeights = weights.take(columns, 0)
+                guessedLabel = values.dot(activeWeights).argmax()
+                if guessedLabel != label:
+                    activeWeights[:, label] += values
+                    activeWeights[:, guessedLabel] -= values
+                    weights[columns] = activeWeights
+                    if self.averaged:
+                        activeSums = updateSums.take(columns, 0)
+                        activeSums[:, label] += seen * values
+                        activeSums[:, guessedLabel] -= seen * values
+                        updateSums[columns] = activeSums
+                    mistakes += 1
+                seen += 1
+
+            if self.averaged:
+                currentWeights = weights - updateSums / seen
+            else:
+                currentWeights = weights.copy()
+            guesses = validationData.matrix.dot(currentWeights).argmax(1)
+            accuracy = (guesses == validationRows).mean()
+            print "Iteration %d: %d mistakes, %.1f%% correct on validation data" % (iteration, mistakes, 100.0 * accuracy)
+
+            if accuracy > bestAccuracy:
+                bestAccuracy, bestWeights, bestIteration = accuracy, currentWeights, iteration
+            stop = mistakes == 0 or iteration - bestIteration >= self.patience
+            if stop and iteration < self.max_iterations - 1:
+                print "Stopping early, keeping the weights of iteration", bestIteration
+                break
+        self.weights = weightCounters(bestWeights.T, trainingData.features, labels)
+
     def doIteration(self, iteration, trainingData, trainingLabels):
         print "Starting iteration ", iteration, "..."
         for i in range(len(trainingData)):
@@ -79,6 +184,11 @@ class PerceptronClassifier:
         Recall that a datum is a util.counter...
         """
 
+        if isinstance(data, FeatureMatrix):
+            labels = labelOrder(self.legalLabels)
+            weights = weightMatrix(self.weights, data.features, labels)
+            return [labels[row] for row in data.matrix.dot(weights.T).argmax(1)]
+
         guesses = []
         for datum in data:
             vectors = util.Counter()
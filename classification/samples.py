@@ -13,11 +13,25 @@
 
 
 import util
+import os
+import string
+import struct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 ## Constants
 DATUM_WIDTH = 0 # in pixels
 DATUM_HEIGHT = 0 # in pixels
 
+DATA_ZIP = 'data.zip'
+CACHE_DIRECTORY = 'data.cache' # binary copies of the data files, next to data.zip
+CACHE_MAGIC = 'PACDATA1'
+CACHE_HEADER = struct.Struct('<8s4s3I') # magic, numpy dtype, shape padded with zeros to 3 sizes
+PIXEL_VALUES = string.maketrans(' +#', '\x00\x01\x02')
+
 ## Module Classes
 
 class Datum:
@@ -94,6 +108,23 @@ class Datum:
     def __str__(self):
         return self.getAsciiString()
 
+class ArrayDatum(Datum):
+    """
+    A Datum whose pixels are a width x height numpy array, usually a view
+    into a memory-mapped data cache (see loadDataArray), so reading a pixel
+    builds no lists.  getPixels returns the array itself, which indexes as
+    pixels[column][row] like the lists of a Datum.
+    """
+    def __init__(self, pixels):
+        self.width, self.height = pixels.shape
+        self.pixels = pixels
+
+    def getPixel(self, column, row):
+        return self.pixels.item(column, row)
+
+    def getAsciiString(self):
+        return "\n".join(["".join(map(asciiGrayscaleConversionFunction, row)) for row in self.pixels.T.tolist()])
+
 
 
 # Data processing, cleanup and display functions
@@ -103,6 +134,20 @@ def loadDataFile(filename, n,width,height):
     Reads n data images from a file and returns a list of Datum objects.
 
     (Return less then n items if the end of file is encountered).
+
+    With numpy, the images come from the file's binary cache (see
+    loadDataArray) as ArrayDatum objects.
+    """
+    if numpy is None:
+        return readDataFile(filename, n, width, height)
+    images = loadDataArray(filename, width, height)
+    if n > len(images):
+        print "Truncating at %d examples (maximum)" % len(images)
+    return [ArrayDatum(pixels) for pixels in images[:n]]
+
+def readDataFile(filename, n,width,height):
+    """
+    loadDataFile without numpy: parses the ASCII images into Datum objects.
     """
     DATUM_WIDTH=width
     DATUM_HEIGHT=height
@@ -121,27 +166,110 @@ def loadDataFile(filename, n,width,height):
     return items
 
 import zipfile
-import os
 def readlines(filename):
     "Opens a file or reads it from the zip archive data.zip"
     if(os.path.exists(filename)):
         return [l[:-1] for l in open(filename).readlines()]
     else:
-        z = zipfile.ZipFile('data.zip')
+        z = zipfile.ZipFile(DATA_ZIP)
         return z.read(filename).split('\n')
 
 def loadLabelsFile(filename, n):
     """
     Reads n labels from a file and returns a list of integers.
     """
+    if numpy is not None:
+        return loadCachedArray(filename, lambda: numpy.array(readLabelsFile(filename), dtype=numpy.int32))[:n].tolist()
+    return readLabelsFile(filename, n)
+
+def readLabelsFile(filename, n=None):
+    "loadLabelsFile without the cache; reads every label when n is None"
     fin = readlines(filename)
+    if n is not None:
+        fin = fin[:min(n, len(fin))]
     labels = []
-    for line in fin[:min(n, len(fin))]:
+    for line in fin:
         if line == '':
             break
         labels.append(int(line))
     return labels
 
+def loadDataArray(filename, width, height):
+    """
+    Returns every image of an ASCII data file as a read-only count x width
+    x height uint8 array, indexed like Datum pixels.  The first load parses
+    the file once into a binary cache in data.cache, next to data.zip;
+    later loads memory-map the cache, so they cost nothing until pixels
+    are read.
+    """
+    images = loadCachedArray(filename, lambda: parseDataArray(filename, width, height))
+    if images.shape[1:] != (width, height):
+        images = loadCachedArray(filename, lambda: parseDataArray(filename, width, height), True)
+    return images
+
+def parseDataArray(filename, width, height):
+    "Parses every complete image of an ASCII data file into a count x width x height uint8 array"
+    lines = readlines(filename)
+    count = 0
+    while (count + 1) * height <= len(lines) and len(lines[count * height]) >= width - 1:
+        count += 1
+    text = "".join([line.ljust(width)[:width] for line in lines[:count * height]])
+    rows = numpy.frombuffer(text.translate(PIXEL_VALUES), dtype=numpy.uint8).reshape(count, height, width)
+    return numpy.ascontiguousarray(rows.transpose(0, 2, 1))
+
+def getCachePath(filename):
+    return os.path.join(os.path.dirname(DATA_ZIP), CACHE_DIRECTORY, filename.replace('/', '-') + '.bin')
+
+def loadCachedArray(filename, parse, rebuild=False):
+    """
+    Returns the array parse() reads from filename, memory-mapped from its
+    binary cache.  The cache is a CACHE_HEADER followed by the raw array;
+    it is written when missing, older than its source or when rebuild is
+    set.  If it can't be written the parsed array is returned instead.
+    """
+    path = getCachePath(filename)
+    source = os.path.exists(filename) and filename or DATA_ZIP
+    if rebuild or not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(source):
+        array = parse()
+        try:
+            writeCachedArray(path, array)
+        except (IOError, OSError):
+            return array
+    return readCachedArray(path)
+
+def writeCachedArray(path, array):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    shape = array.shape + (0,) * (3 - array.ndim)
+    # A name of our own, so processes building the same entry never share a file
+    temporary = '%s.%d.tmp' % (path, os.getpid())
+    out = open(temporary, 'wb')
+    try:
+        out.write(CACHE_HEADER.pack(CACHE_MAGIC, array.dtype.str[1:], *shape))
+        out.write(numpy.ascontiguousarray(array).tostring())
+    finally:
+        out.close()
+    try:
+        os.rename(temporary, path)
+    except OSError:
+        # Windows does not rename over an existing file
+        os.remove(path)
+        os.rename(temporary, path)
+
+def readCachedArray(path):
+    f = open(path, 'rb')
+    try:
+        magic, dtype, count, width, height = CACHE_HEADER.unpack(f.read(CACHE_HEADER.size))
+    finally:
+        f.close()
+    if magic != CACHE_MAGIC:
+        raise IOError('%s is not a data cache' % path)
+    dtype = dtype.rstrip('\x00')
+    shape = (count,) + tuple([size for size in (width, height) if size])
+    if count == 0:
+        return numpy.zeros(shape, dtype=dtype)
+    return numpy.memmap(path, dtype=dtype, mode='r', offset=CACHE_HEADER.size, shape=shape)
+
 def loadPacmanStatesFile(filename, n):
     f = open(filename, 'r')
     result = cPickle.load(f)
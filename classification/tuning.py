@@ -0,0 +1,80 @@
+# tuning.py
+# ---------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+# Hyperparameter tuning: trains and validates one model per candidate value,
+# optionally spread over a pool of worker processes
+import sys
+import time
+import cStringIO
+
+# The evaluation function and candidates being tuned by tuneCandidates.  Worker
+# processes inherit them when the pool forks, so neither the classifier nor its
+# training data is ever pickled; only candidate indices and results are.
+_tuningArgs = None
+
+def evaluateCandidate(evaluate, candidate):
+    "Returns the tuning result of one candidate: its model, validation accuracy and training time"
+    startTime = time.time()
+    model, accuracy = evaluate(candidate)
+    return {'candidate': candidate,
+            'model': model,
+            'accuracy': accuracy,
+            'time': time.time() - startTime,
+            'output': ''}
+
+def _evaluateParallelCandidate( index ):
+    """
+    Evaluates one candidate in a worker process.  What it prints is returned
+    as the result's output so the parent can print it in candidate order.
+    """
+    evaluate, candidates = _tuningArgs
+    stdout = sys.stdout
+    sys.stdout = cStringIO.StringIO()
+    try:
+        result = evaluateCandidate(evaluate, candidates[index])
+        result['output'] = sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+    return result
+
+def tuneCandidates(evaluate, candidates, jobs=1):
+    """
+    Yields the result of each candidate (see evaluateCandidate), in candidate
+    order.  evaluate(candidate) trains a model with that hyperparameter value
+    and returns the model and its accuracy on the validation data; the model
+    must be picklable when jobs > 1.
+
+    With jobs > 1 the candidates are evaluated by a pool of that many worker
+    processes, which share the training data with this process by fork and
+    so must treat it, and the rest of the classifier, as read-only: anything
+    evaluate changes in a worker is lost.  Candidates are evaluated in this
+    process, one at a time, otherwise.
+    """
+    global _tuningArgs
+    if jobs <= 1 or len(candidates) <= 1:
+        for candidate in candidates:
+            yield evaluateCandidate(evaluate, candidate)
+        return
+
+    import multiprocessing
+    _tuningArgs = (evaluate, candidates)
+    pool = multiprocessing.Pool(min(jobs, len(candidates)))
+    try:
+        for result in pool.imap( _evaluateParallelCandidate, range(len(candidates)) ):
+            sys.stdout.write(result['output'])
+            yield result
+    finally:
+        pool.close()
+        pool.join()
+        _tuningArgs = None
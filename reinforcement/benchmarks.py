@@ -0,0 +1,347 @@
+# benchmarks.py
+# -------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Micro-benchmarks for the reinforcement project's MDP solvers.
+
+  python benchmarks.py                 runs every benchmark
+  python benchmarks.py -b valueIteration -g 60 -i 100
+"""
+
+import cStringIO
+import random
+import sys
+import time
+
+import featureExtractors
+import gridworld
+import layout
+import mdp as mdpModule
+import pacman
+import qlearningAgents
+import util
+import valueIterationAgents
+
+
+def timeIt(function, *args):
+    "Returns (result, seconds) for a single call of function(*args)"
+    start = time.time()
+    result = function(*args)
+    return result, time.time() - start
+
+
+def generateGrid(size, wallDensity, seed):
+    """
+    Returns a size x size Gridworld with random walls at the given density,
+    a +1 exit in the top right corner, a -1 exit next to it and the start
+    in the bottom left.
+    """
+    rand = random.Random(seed)
+    rows = []
+    for y in range(size):
+        rows.append([rand.random() < wallDensity and '#' or ' ' for x in range(size)])
+    rows[0][size - 1] = 1
+    rows[1][size - 1] = -1
+    rows[size - 1][0] = 'S'
+    return gridworld.Gridworld(rows)
+
+
+def getBenchmarkGrids(options):
+    grids = [('MazeGrid', gridworld.getMazeGrid()), ('BookGrid', gridworld.getBookGrid())]
+    for size in (options.gridSize // 2, options.gridSize):
+        grids.append(('generated %dx%d' % (size, size), generateGrid(size, 0.2, 0)))
+    return grids
+
+
+def benchmarkValueIteration(options):
+    for name, mdp in getBenchmarkGrids(options):
+        _, loopSeconds = timeIt(valueIterationAgents.ValueIterationAgent, mdp, options.discount, options.iterations)
+        agent, vectorSeconds = timeIt(valueIterationAgents.ValueIterationAgent, mdp, options.discount, options.iterations, True)
+        print '%-18s states=%6d iterations=%d  loop %7.3fs  vectorized %7.3fs  (%.0fx)' % \
+              (name, len(mdp.getStates()), options.iterations, loopSeconds, vectorSeconds,
+               loopSeconds / max(vectorSeconds, 1e-9))
+
+
+def maxError(agent, reference, states):
+    return max([abs(agent.getValue(state) - reference.getValue(state)) for state in states])
+
+
+def benchmarkValueIterationModes(options):
+    """
+    Runs every value iteration variant to within options.epsilon and reports
+    the work done and the distance from the converged values.
+    """
+    modes = [('synchronous', lambda mdp, iterations: valueIterationAgents.ValueIterationAgent(
+                 mdp, options.discount, iterations, True, options.epsilon)),
+             ('gaussSeidel', lambda mdp, iterations: valueIterationAgents.GaussSeidelValueIterationAgent(
+                 mdp, options.discount, iterations, options.epsilon)),
+             ('prioritized', lambda mdp, iterations: valueIterationAgents.PrioritizedSweepingValueIterationAgent(
+                 mdp, options.discount, iterations, options.epsilon))]
+    for name, mdp in getBenchmarkGrids(options)[:-1]:
+        states = mdp.getStates()
+        reference = valueIterationAgents.ValueIterationAgent(mdp, options.discount, 100000, True, 1e-12)
+        fixed = valueIterationAgents.ValueIterationAgent(mdp, options.discount, options.iterations, True)
+        print '%-18s %-12s sweeps=%8.1f backups=%8d                error=%.2e' % \
+              (name, 'fixed', fixed.sweeps, fixed.backups, maxError(fixed, reference, states))
+        for label, makeAgent in modes:
+            agent, seconds = timeIt(makeAgent, mdp, 100000)
+            print '%-18s %-12s sweeps=%8.1f backups=%8d  %7.3fs  error=%.2e' % \
+                  (name, label, agent.sweeps, agent.backups, seconds, maxError(agent, reference, states))
+
+
+def benchmarkPolicyIteration(options):
+    """
+    Compares policy iteration, with the sparse solver and the evaluation used
+    without scipy (dense up to CompiledMDP.DENSE_SOLVE_LIMIT states, iterative
+    beyond), against value iteration run until its residual is below
+    options.epsilon.  Try -d 0.99, where value iteration needs many sweeps.
+    """
+    for name, mdp in getBenchmarkGrids(options):
+        states = mdp.getStates()
+        fallback = len(states) <= mdpModule.CompiledMDP.DENSE_SOLVE_LIMIT and 'dense' or 'iterative'
+        solvers = [mdpModule.scipy and 'sparse' or fallback]
+        if mdpModule.scipy is not None:
+            solvers.append(fallback)
+        for solver in solvers:
+            scipy = mdpModule.scipy
+            if solver != 'sparse': mdpModule.scipy = None
+            try:
+                agent, seconds = timeIt(valueIterationAgents.PolicyIterationAgent, mdp, options.discount, options.iterations)
+            finally:
+                mdpModule.scipy = scipy
+            print '%-18s %-18s states=%6d improvements=%3d evaluations=%3d  %7.3fs' % \
+                  (name, 'policy (%s)' % solver, len(states), agent.sweeps, agent.evaluations, seconds)
+
+        for label, vectorized in (('value (numpy)', True), ('value (loop)', False)):
+            if not vectorized and len(states) > 1000: continue
+            valueAgent, seconds = timeIt(valueIterationAgents.ValueIterationAgent, mdp, options.discount,
+                                         100000, vectorized, options.epsilon)
+            samePolicy = len([s for s in states if valueAgent.getPolicy(s) == agent.getPolicy(s)])
+            print '%-18s %-18s sweeps=%6d  %7.3fs  error=%.2e  same policy in %d/%d states' % \
+                  (name, label, valueAgent.sweeps, seconds, maxError(valueAgent, agent, states),
+                   samePolicy, len(states))
+
+
+class UncachedGridworld(gridworld.Gridworld):
+    "A Gridworld that recomputes its states and transitions on every call, as it used to.  Baseline only."
+    def getStates(self):
+        return self.computeStates()
+
+    def getTransitionStatesAndProbs(self, state, action):
+        return self.computeTransitionStatesAndProbs(state, action)
+
+
+def queryModel(mdp):
+    "Asks for the transitions of every (state, action) once; returns the number of queries"
+    queries = 0
+    for state in mdp.getStates():
+        for action in mdp.getPossibleActions(state):
+            mdp.getTransitionStatesAndProbs(state, action)
+            queries += 1
+    return queries
+
+
+def benchmarkGridworldModel(options):
+    size = options.modelSize
+    grid = generateGrid(size, 0.2, 0).grid
+    for label, gridworldClass in (('cached', gridworld.Gridworld), ('uncached', UncachedGridworld)):
+        mdp = gridworldClass(grid)
+        agent, sweepSeconds = timeIt(valueIterationAgents.ValueIterationAgent, mdp, options.discount, 3)
+        _, compileSeconds = timeIt(mdpModule.CompiledMDP, mdp)
+        queries, querySeconds = timeIt(queryModel, mdp)
+        print 'generated %dx%d %-9s states=%6d  3 value iteration sweeps %7.3fs  CompiledMDP %7.3fs  %.2fus/transition query' % \
+              (size, size, label, len(mdp.getStates()), sweepSeconds, compileSeconds, 1e6 * querySeconds / queries)
+
+
+def recordTransitions(mdp, episodes, seed):
+    "Returns the (state, action, nextState, reward) steps of random walks on mdp"
+    random.seed(seed)
+    environment = gridworld.GridworldEnvironment(mdp)
+    transitions = []
+    for episode in range(episodes):
+        environment.reset()
+        while True:
+            state = environment.getCurrentState()
+            actions = mdp.getPossibleActions(state)
+            if not actions:
+                break
+            action = random.choice(actions)
+            nextState, reward = environment.doAction(action)
+            transitions.append((state, action, nextState, reward))
+    return transitions
+
+
+def replayTransitions(agent, transitions, seed):
+    "Feeds every transition to agent and asks for its policy in the new state"
+    random.seed(seed)
+    for state, action, nextState, reward in transitions:
+        agent.update(state, action, nextState, reward)
+        agent.getPolicy(nextState)
+
+
+def benchmarkQTable(options):
+    grids = getBenchmarkGrids(options)[:2] + [('generated 12x12', generateGrid(12, 0.2, 0))]
+    for name, mdp in grids:
+        transitions = recordTransitions(mdp, options.episodes, 0)
+        agents = []
+        for label, qTable in (('QTable', True), ('dict', False)):
+            agent = qlearningAgents.QLearningAgent(actionFn=mdp.getPossibleActions, alpha=0.5,
+                                                   gamma=options.discount, qTable=qTable)
+            _, seconds = timeIt(replayTransitions, agent, transitions, 0)
+            agents.append(agent)
+            print '%-18s %-7s transitions=%7d  %7.3fs  (%.2fus/update and policy)' % \
+                  (name, label, len(transitions), seconds, 1e6 * seconds / len(transitions))
+        same = [agents[0].getQValue(s, a) == agents[1].getQValue(s, a)
+                for s in mdp.getStates() for a in mdp.getPossibleActions(s)]
+        print '%-18s same Q-values: %s' % (name, all(same))
+
+
+def recordPacmanTransitions(board, games, seed):
+    "Returns (state, action, nextState, reward) for Pacman's moves in random games on board"
+    rand = random.Random(seed)
+    transitions = []
+    for game in range(games):
+        state = pacman.GameState()
+        state.initialize(board, board.getNumGhosts())
+        agentIndex = 0
+        while not (state.isWin() or state.isLose()):
+            action = rand.choice(state.getLegalActions(agentIndex))
+            nextState = state.generateSuccessor(agentIndex, action)
+            if agentIndex == 0:
+                transitions.append((state, action, nextState, nextState.getScore() - state.getScore()))
+            state = nextState
+            agentIndex = (agentIndex + 1) % state.getNumAgents()
+    return transitions
+
+
+def benchmarkApproximateQ(options):
+    for name in ('smallClassic', 'mediumClassic'):
+        transitions = recordPacmanTransitions(layout.getLayout(name), 40, 0)
+        for extractor in ('IdentityExtractor', 'SimpleExtractor'):
+            agents = []
+            for label, sparse in (('sparse', 1), ('Counter', 0)):
+                # Best of three fresh agents, to keep timer noise down
+                seconds = None
+                for repeat in range(3):
+                    agent = qlearningAgents.ApproximateQAgent(extractor=extractor, sparse=sparse)
+                    _, elapsed = timeIt(replayTransitions, agent, transitions, 0)
+                    seconds = min(seconds or elapsed, elapsed)
+                agents.append(agent)
+                print '%-14s %-18s %-8s transitions=%6d  %.2fus/update and policy' % \
+                      (name, extractor, label, len(transitions), 1e6 * seconds / len(transitions))
+            weights = agents[0].getWeights()
+            reference = agents[1].getWeights()
+            error = max([abs(weights[f] - reference[f]) for f in set(weights) | set(reference)] or [0])
+            print '%-14s %-18s %d weights, largest difference %.2e' % (name, extractor, len(weights), error)
+
+
+def trainPacman(board, agentArgs, numTraining, numTests, seed):
+    "Trains an ApproximateQAgent on board; returns how many of the numTests games after it won"
+    random.seed(seed)
+    args = pacman.readCommand(['-p', 'ApproximateQAgent', '-a', agentArgs, '-l', board, '-q',
+                               '-x', str(numTraining), '-n', str(numTraining + numTests)])
+    stdout, sys.stdout = sys.stdout, cStringIO.StringIO()
+    try:
+        games = pacman.runGames(**args)
+    finally:
+        sys.stdout = stdout
+    return len([game for game in games if game.state.isWin()])
+
+
+def benchmarkExperienceReplay(options):
+    """
+    Test win rates of ApproximateQAgent after growing numbers of training
+    games, learning online only and with a replayed mini-batch per
+    transition.  With IdentityExtractor each weight is one Q-value, as in
+    the -x 2000 smallGrid runs of PacmanQAgent.
+    """
+    numTests, seeds = 50, 3
+    for replayRatio in (0, 1):
+        for numTraining in (250, 500, 1000):
+            agentArgs = 'extractor=IdentityExtractor,replayRatio=%s' % replayRatio
+            wins, seconds = timeIt(lambda: sum([trainPacman('smallGrid', agentArgs, numTraining, numTests, seed)
+                                                for seed in range(seeds)]))
+            print 'smallGrid  replayRatio=%g  training games=%5d  win rate %.2f  %.1fs/run' % \
+                  (replayRatio, numTraining, wins / float(numTests * seeds), seconds / seeds)
+
+
+def benchmarkFoodDistances(options):
+    """
+    Times SimpleExtractor.getFeatures with closestFood looked up in cached
+    distance fields against the breadth first search it used to run on
+    every call, and checks that both give the same features.  Like a
+    Q-learning agent choosing its move, it extracts the features of every
+    legal action of each state.
+    """
+    for name in ('mediumClassic', 'originalClassic'):
+        transitions = [(state, action) for state, _, _, _ in recordPacmanTransitions(layout.getLayout(name), 10, 0)
+                       for action in state.getLegalActions(0)]
+        results = []
+        for label, closestFood in (('field', featureExtractors.closestFood),
+                                   ('BFS', featureExtractors.closestFoodSearch)):
+            featureExtractors.FOOD_DISTANCES = featureExtractors.FoodDistances()
+            original = featureExtractors.closestFood
+            featureExtractors.closestFood = closestFood
+            try:
+                extractor = featureExtractors.SimpleExtractor()
+                extract = lambda: [extractor.getFeatures(state, action) for state, action in transitions]
+                features, seconds = timeIt(extract)
+            finally:
+                featureExtractors.closestFood = original
+            results.append(features)
+            print '%-16s %-6s calls=%6d  %.2fus/getFeatures' % \
+                  (name, label, len(transitions), 1e6 * seconds / len(transitions))
+        print '%-16s same features: %s' % (name, results[0] == results[1])
+
+
+BENCHMARKS = [
+    ('valueIteration', benchmarkValueIteration),
+    ('valueIterationModes', benchmarkValueIterationModes),
+    ('policyIteration', benchmarkPolicyIteration),
+    ('gridworldModel', benchmarkGridworldModel),
+    ('qTable', benchmarkQTable),
+    ('approximateQ', benchmarkApproximateQ),
+    ('foodDistances', benchmarkFoodDistances),
+    ('experienceReplay', benchmarkExperienceReplay),
+]
+
+
+def readCommand(argv):
+    from optparse import OptionParser
+    parser = OptionParser('USAGE: python benchmarks.py [options]')
+    parser.add_option('-b', '--benchmark', dest='benchmark', default=None,
+                      help='only run the named benchmark (%s)' % ', '.join([n for n, _ in BENCHMARKS]))
+    parser.add_option('-g', '--gridSize', dest='gridSize', type='int', default=60,
+                      help='side of the largest generated gridworld')
+    parser.add_option('-m', '--modelSize', dest='modelSize', type='int', default=100,
+                      help='side of the generated gridworld for the gridworldModel benchmark')
+    parser.add_option('-k', '--episodes', dest='episodes', type='int', default=200,
+                      help='number of q-learning episodes')
+    parser.add_option('-i', '--iterations', dest='iterations', type='int', default=100,
+                      help='number of value iteration sweeps')
+    parser.add_option('-d', '--discount', dest='discount', type='float', default=0.9,
+                      help='discount factor')
+    parser.add_option('-e', '--epsilon', dest='epsilon', type='float', default=1e-4,
+                      help='residual at which the convergence-driven modes stop')
+    options, _ = parser.parse_args(argv)
+    return options
+
+
+if __name__ == '__main__':
+    import sys
+    options = readCommand(sys.argv[1:])
+    for name, benchmark in BENCHMARKS:
+        if options.benchmark is None or options.benchmark == name:
+            print '*** %s' % name
+            benchmark(options)
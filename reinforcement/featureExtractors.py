@@ -17,6 +17,26 @@
 from game import Directions, Actions
 import util
 
+class FeatureIndex:
+    """
+      Numbers feature names (the keys returned by getFeatures) with
+      consecutive integer ids, so that a feature vector can be kept as
+      a pair of (ids, values) lists and weights in an array.
+    """
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def getId(self, name):
+        id = self.ids.get(name)
+        if id is None:
+            id = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return id
+
+    def __len__(self):
+        return len(self.names)
+
 class FeatureExtractor:
     def getFeatures(self, state, action):
         """
@@ -26,12 +46,26 @@ class FeatureExtractor:
         """
         util.raiseNotDefined()
 
+    def getSparseFeatures(self, state, action, featureIndex):
+        """
+          Returns the features of getFeatures as a sparse vector: a list
+          of ids from featureIndex and a list of the matching values.
+        """
+        indices, values = [], []
+        for name, value in self.getFeatures(state, action).items():
+            indices.append(featureIndex.getId(name))
+            values.append(value)
+        return indices, values
+
 class IdentityExtractor(FeatureExtractor):
     def getFeatures(self, state, action):
         feats = util.Counter()
         feats[(state,action)] = 1.0
         return feats
 
+    def getSparseFeatures(self, state, action, featureIndex):
+        return [featureIndex.getId((state, action))], [1.0]
+
 class CoordinateExtractor(FeatureExtractor):
     def getFeatures(self, state, action):
         feats = util.Counter()
@@ -41,15 +75,229 @@ class CoordinateExtractor(FeatureExtractor):
         feats['action=%s' % action] = 1.0
         return feats
 
+class BoundedCache:
+    """
+      A memo of about `size` entries that forgets the least recently used
+      ones first.  It is an approximate LRU made of two dicts: entries go
+      into the newer one, which replaces the older one once it holds
+      size / 2 entries, and an entry found in the older one is moved
+      forward.  Unlike collections.OrderedDict this costs a dict lookup
+      or two.  hits and misses count the lookups.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.recent = {}
+        self.older = {}
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key, compute):
+        "Returns the value stored for key, calling compute() to make it if there is none"
+        try:
+            value = self.recent[key]
+            self.hits += 1
+            return value
+        except KeyError:
+            pass
+        if key in self.older:
+            value = self.older.pop(key)
+            self.hits += 1
+        else:
+            value = compute()
+            self.misses += 1
+        if 2 * len(self.recent) >= self.size:
+            self.older, self.recent = self.recent, {}
+        self.recent[key] = value
+        return value
+
+    def getHitRate(self):
+        return self.hits / float(max(self.hits + self.misses, 1))
+
+class CachingExtractor(FeatureExtractor):
+    """
+      Wraps another extractor and remembers the features of about the
+      last `size` (state, action) pairs it was asked for (see BoundedCache).
+      States are compared by hash and equality, so a pair asked for
+      several times in one step (choosing the action, then updating on
+      it) is only extracted once.
+
+      The returned features are shared with the cache: don't modify them.
+
+      Sparse features are kept in a cache of their own, sparseCache, for
+      the last featureIndex asked for, so that their keys are (state,
+      action) pairs too: hashing the index in every key costs more than
+      the lookup itself.
+    """
+    def __init__(self, extractor, size=1000):
+        self.extractor = extractor
+        self.cache = BoundedCache(size)
+        self.sparseCache = BoundedCache(size)
+        self.sparseIndex = None
+
+    def getFeatures(self, state, action):
+        return self.cache.lookup((state, action), lambda: self.extractor.getFeatures(state, action))
+
+    def getSparseFeatures(self, state, action, featureIndex):
+        if featureIndex is not self.sparseIndex:
+            self.sparseCache = BoundedCache(self.cache.size)
+            self.sparseIndex = featureIndex
+        return self.sparseCache.lookup((state, action),
+                                       lambda: self.extractor.getSparseFeatures(state, action, featureIndex))
+
+class FoodDistances:
+    """
+      Distance fields to the nearest food.  One BFS started from every
+      food cell at once gives the maze distance from each cell to its
+      closest food, so closestFood becomes a list lookup.  Fields are
+      kept per (food, walls) pair in a BoundedCache; successor states
+      that ate nothing share their food grid, so they share the field.
+
+      When Pacman eats one pellet, the new field is patched from the last
+      one computed: only the cells whose every shortest path led to the
+      eaten pellet are searched again.
+    """
+    UNREACHABLE = -1
+
+    def __init__(self, size=64):
+        self.cache = BoundedCache(size)
+        self.neighbors = BoundedCache(8)
+        self.last = None
+
+    def getField(self, food, walls):
+        """
+          Returns a list holding, at x * walls.height + y, the distance
+          from (x, y) to the closest food or UNREACHABLE.  Only valid for
+          cells that are not walls.  Don't modify it.
+        """
+        return self.cache.lookup((food, walls), lambda: self.computeField(food, walls))
+
+    def getNeighborIndices(self, walls):
+        "The legal neighbours of every cell as indices x * height + y"
+        def compute():
+            height = walls.height
+            return [[x * height + y for x, y in neighbors]
+                    for neighbors in Actions.getMoveTable(walls).legalNeighbors]
+        return self.neighbors.lookup(walls, compute)
+
+    def computeField(self, food, walls):
+        eaten = None
+        if self.last is not None:
+            lastFood, lastWalls, lastField = self.last
+            if lastWalls is walls and lastFood.count() == food.count() + 1:
+                eaten = self.findEatenFood(lastFood, food)
+        if eaten is None:
+            field = self.searchField(food, walls)
+        else:
+            field = self.removeFood(lastField, eaten, walls)
+        self.last = (food, walls, field)
+        return field
+
+    def findEatenFood(self, lastFood, food):
+        "The index of the only cell that has food in lastFood but not in food, or None"
+        columns = [x for x, column in enumerate(food.data) if column != lastFood.data[x]]
+        if len(columns) != 1:
+            return None
+        x = columns[0]
+        column, lastColumn = food[x], lastFood[x]
+        rows = [y for y in range(food.height) if column[y] != lastColumn[y]]
+        if len(rows) != 1 or not lastColumn[rows[0]]:
+            return None
+        return x * food.height + rows[0]
+
+    def searchField(self, food, walls):
+        height = walls.height
+        neighbors = self.getNeighborIndices(walls)
+        field = [FoodDistances.UNREACHABLE] * (walls.width * height)
+        frontier = [x * height + y for x, y in food.asList() if not walls[x][y]]
+        for index in frontier:
+            field[index] = 0
+        distance = 0
+        while frontier:
+            distance += 1
+            nextFrontier = []
+            for index in frontier:
+                for next in neighbors[index]:
+                    if field[next] < 0:
+                        field[next] = distance
+                        nextFrontier.append(next)
+            frontier = nextFrontier
+        return field
+
+    def removeFood(self, lastField, eaten, walls):
+        "Patches lastField for the food at index eaten having been eaten"
+        neighbors = self.getNeighborIndices(walls)
+        field = lastField[:]
+        if field[eaten] != 0:
+            return field # the food was on a wall
+        # Cells lose their distance when all their neighbours one step
+        # closer to food have lost theirs; BFS order settles each level
+        # before the next one is looked at.
+        lost = set([eaten])
+        frontier = [eaten]
+        while frontier:
+            nextFrontier = []
+            for index in frontier:
+                distance = field[index] + 1
+                for next in neighbors[index]:
+                    if field[next] == distance and next not in lost and \
+                       all([field[n] != distance - 1 or n in lost for n in neighbors[next]]):
+                        lost.add(next)
+                        nextFrontier.append(next)
+            frontier = nextFrontier
+        # Search the lost cells again, starting each one whose neighbours
+        # kept their distances at the time those distances give it
+        seeds = []
+        for index in lost:
+            field[index] = FoodDistances.UNREACHABLE
+            kept = [field[n] for n in neighbors[index] if n not in lost and field[n] >= 0]
+            if kept:
+                seeds.append((min(kept) + 1, index))
+        seeds.sort(reverse=True)
+        frontier = []
+        while seeds or frontier:
+            if not frontier:
+                distance = seeds[-1][0]
+            while seeds and seeds[-1][0] == distance:
+                _, index = seeds.pop()
+                if field[index] < 0:
+                    field[index] = distance
+                    frontier.append(index)
+            nextFrontier = []
+            for index in frontier:
+                for next in neighbors[index]:
+                    if field[next] < 0 and next in lost:
+                        field[next] = distance + 1
+                        nextFrontier.append(next)
+            distance += 1
+            frontier = nextFrontier
+        return field
+
+FOOD_DISTANCES = FoodDistances()
+
 def closestFood(pos, food, walls):
     """
-    closestFood -- this is similar to the function that we have
+    closestFood -- the maze distance from pos to the nearest food, or
+    None if no food can be reached.  Looked up in a FoodDistances field.
+    """
+    x, y = pos
+    if walls[x][y]:
+        # Fields only hold distances between open cells
+        return closestFoodSearch(pos, food, walls)
+    distance = FOOD_DISTANCES.getField(food, walls)[x * walls.height + y]
+    if distance == FoodDistances.UNREACHABLE:
+        return None
+    return distance
+
+def closestFoodSearch(pos, food, walls):
+    """
+    closestFoodSearch -- this is similar to the function that we have
     worked on in the search project; here its all in one place
     """
-    fringe = [(pos[0], pos[1], 0)]
+    fringe = util.Queue()
+    fringe.push((pos[0], pos[1], 0))
     expanded = set()
-    while fringe:
-        pos_x, pos_y, dist = fringe.pop(0)
+    while not fringe.isEmpty():
+        pos_x, pos_y, dist = fringe.pop()
         if (pos_x, pos_y) in expanded:
             continue
         expanded.add((pos_x, pos_y))
@@ -59,7 +307,7 @@ def closestFood(pos, food, walls):
         # otherwise spread out from the location to its neighbours
         nbrs = Actions.getLegalNeighbors((pos_x, pos_y), walls)
         for nbr_x, nbr_y in nbrs:
-            fringe.append((nbr_x, nbr_y, dist+1))
+            fringe.push((nbr_x, nbr_y, dist+1))
     # no food found
     return None
 
@@ -33,6 +33,8 @@ import math
 from math import pi as PI
 
 robotType = 'crawler'
+# Set to True to keep the crawler's Q-values in an array-backed QTable
+useQTable = False
 
 class Application:
 
@@ -182,7 +184,7 @@ class Application:
           simulation.SimulationEnvironment(self.robotEnvironment,agent)
         actionFn = lambda state: \
           self.robotEnvironment.getPossibleActions(state)
-        self.learner = qlearningAgents.QLearningAgent(actionFn=actionFn)
+        self.learner = qlearningAgents.QLearningAgent(actionFn=actionFn, qTable=useQTable)
 
         self.learner.setEpsilon(self.epsilon)
         self.learner.setLearningRate(self.alpha)
@@ -32,6 +32,10 @@ class Gridworld(mdp.MarkovDecisionProcess):
         self.livingReward = 0.0
         self.noise = 0.2
 
+        # model built on demand (see getStates and getTransitionStatesAndProbs)
+        self.states = None
+        self.transitions = {}
+
     def setLivingReward(self, reward):
         """
         The (negative) reward for exiting "normal" states.
@@ -46,6 +50,8 @@ class Gridworld(mdp.MarkovDecisionProcess):
         """
         The probability of moving in an unintended direction.
         """
+        if noise != self.noise:
+            self.transitions = {}
         self.noise = noise
 
 
@@ -68,6 +74,11 @@ class Gridworld(mdp.MarkovDecisionProcess):
         """
         Return list of all states.
         """
+        if self.states is None:
+            self.states = self.computeStates()
+        return self.states[:]
+
+    def computeStates(self):
         # The true terminal state.
         states = [self.grid.terminalState]
         for x in range(self.grid.width):
@@ -117,8 +128,18 @@ class Gridworld(mdp.MarkovDecisionProcess):
         representing the states reachable
         from 'state' by taking 'action' along
         with their transition probabilities.
+
+        The lists are computed once per (state, action) and kept until
+        setNoise changes the noise; the living reward is not part of them.
         """
+        try:
+            return self.transitions[(state, action)][:]
+        except KeyError:
+            successors = self.computeTransitionStatesAndProbs(state, action)
+            self.transitions[(state, action)] = successors
+            return successors[:]
 
+    def computeTransitionStatesAndProbs(self, state, action):
         if action not in self.getPossibleActions(state):
             raise "Illegal action!"
 
@@ -377,6 +398,19 @@ def runEpisode(agent, environment, discount, decision, display, message, pause,
     if 'stopEpisode' in dir(agent):
         agent.stopEpisode()
 
+def getValueIterationAgent(mdp, opts, iterations):
+    "Builds the value iteration agent chosen by --valueMode"
+    import valueIterationAgents
+    if opts.valueMode == 'gaussSeidel':
+        return valueIterationAgents.GaussSeidelValueIterationAgent(mdp, opts.discount, iterations, opts.valueEpsilon)
+    if opts.valueMode == 'prioritized':
+        epsilon = opts.valueEpsilon
+        if epsilon is None: epsilon = 1e-5
+        return valueIterationAgents.PrioritizedSweepingValueIterationAgent(mdp, opts.discount, iterations, epsilon)
+    if opts.valueMode == 'policy':
+        return valueIterationAgents.PolicyIterationAgent(mdp, opts.discount, iterations)
+    return valueIterationAgents.ValueIterationAgent(mdp, opts.discount, iterations, opts.vectorized, opts.valueEpsilon)
+
 def parseOptions():
     optParser = optparse.OptionParser()
     optParser.add_option('-d', '--discount',action='store',
@@ -426,6 +460,19 @@ def parseOptions():
                          help='Manually control agent')
     optParser.add_option('-v', '--valueSteps',action='store_true' ,default=False,
                          help='Display each step of value iteration')
+    optParser.add_option('--vectorized',action='store_true',
+                         dest='vectorized',default=False,
+                         help='Run value iteration with numpy on a compiled MDP')
+    optParser.add_option('--qTable',action='store_true',
+                         dest='qTable',default=False,
+                         help='Keep the q-learning agent\'s values in an array-backed QTable')
+    optParser.add_option('--valueMode',action='store', metavar="M",
+                         type='choice',dest='valueMode',default=None,
+                         choices=['synchronous', 'gaussSeidel', 'prioritized', 'policy'],
+                         help='Value iteration variant (synchronous, gaussSeidel, prioritized or policy for policy iteration, default synchronous)')
+    optParser.add_option('--valueEpsilon',action='store', metavar="E",
+                         type='float',dest='valueEpsilon',default=None,
+                         help='Stop value iteration once no value changes by more than E')
 
     opts, args = optParser.parse_args()
 
@@ -482,7 +529,9 @@ if __name__ == '__main__':
     import valueIterationAgents, qlearningAgents
     a = None
     if opts.agent == 'value':
-        a = valueIterationAgents.ValueIterationAgent(mdp, opts.discount, opts.iters)
+        a = getValueIterationAgent(mdp, opts, opts.iters)
+        if opts.valueMode is not None or opts.valueEpsilon is not None or opts.vectorized:
+            print 'VALUE ITERATION (%s): %g sweeps, %d backups' % (opts.valueMode or 'synchronous', a.sweeps, a.backups)
     elif opts.agent == 'q':
         #env.getPossibleActions, opts.discount, opts.learningRate, opts.epsilon
         #simulationFn = lambda agent, state: simulation.GridworldSimulation(agent,state,mdp)
@@ -491,7 +540,8 @@ if __name__ == '__main__':
         qLearnOpts = {'gamma': opts.discount,
                       'alpha': opts.learningRate,
                       'epsilon': opts.epsilon,
-                      'actionFn': actionFn}
+                      'actionFn': actionFn,
+                      'qTable': opts.qTable}
         a = qlearningAgents.QLearningAgent(**qLearnOpts)
     elif opts.agent == 'random':
         # # No reason to use the random agent without episodes
@@ -521,8 +571,13 @@ if __name__ == '__main__':
     try:
         if not opts.manual and opts.agent == 'value':
             if opts.valueSteps:
+                # Agents that run in sweeps advance one per display; the others are rebuilt
+                tempAgent = getValueIterationAgent(mdp, opts, 0)
+                stepping = hasattr(tempAgent, 'step')
                 for i in range(opts.iters):
-                    tempAgent = valueIterationAgents.ValueIterationAgent(mdp, opts.discount, i)
+                    if i > 0:
+                        if stepping: tempAgent.step()
+                        else: tempAgent = getValueIterationAgent(mdp, opts, i)
                     display.displayValues(tempAgent, message = "VALUES AFTER "+str(i)+" ITERATIONS")
                     display.pause()
 
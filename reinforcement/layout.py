@@ -14,10 +14,13 @@
 
 from util import manhattanDistance
 from game import Grid
+from game import ZobristKeys
+from game import Actions
 import os
 import random
 
 VISIBILITY_MATRIX_CACHE = {}
+ZOBRIST_KEYS_CACHE = {}
 
 class Layout:
     """
@@ -35,11 +38,37 @@ class Layout:
         self.processLayoutText(layoutText)
         self.layoutText = layoutText
         self.totalFood = len(self.food.asList())
+        self._zobristKeys = None # see getZobristKeys
         # self.initializeVisibilityMatrix()
 
     def getNumGhosts(self):
         return self.numGhosts
 
+    def getMoveTable(self):
+        "Returns the compiled legal moves of this layout's walls (see Actions.getMoveTable)"
+        return Actions.getMoveTable(self.walls)
+
+    def getZobristKeys(self):
+        """
+        Returns the ZobristKeys for this board, shared by every copy of the layout
+        so that equal game states hash equally.  The keys are looked up once per
+        layout and handed on by deepCopy, since the game rules ask for them on
+        every successor.
+        """
+        keys = getattr(self, '_zobristKeys', None) # layouts pickled before it existed
+        if keys is None:
+            key = ''.join(self.layoutText)
+            if key not in ZOBRIST_KEYS_CACHE:
+                ZOBRIST_KEYS_CACHE[key] = ZobristKeys(self.width, self.height, len(self.agentPositions))
+            keys = self._zobristKeys = ZOBRIST_KEYS_CACHE[key]
+        return keys
+
+    def __getstate__(self):
+        # Recorded games pickle their layout; the keys are looked up again on load
+        state = self.__dict__.copy()
+        state['_zobristKeys'] = None
+        return state
+
     def initializeVisibilityMatrix(self):
         global VISIBILITY_MATRIX_CACHE
         if reduce(str.__add__, self.layoutText) not in VISIBILITY_MATRIX_CACHE:
@@ -90,7 +119,9 @@ class Layout:
         return "\n".join(self.layoutText)
 
     def deepCopy(self):
-        return Layout(self.layoutText[:])
+        layout = Layout(self.layoutText[:])
+        layout._zobristKeys = getattr(self, '_zobristKeys', None)
+        return layout
 
     def processLayoutText(self, layoutText):
         """
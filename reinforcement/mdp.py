@@ -14,6 +14,17 @@
 
 import random
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import scipy.sparse
+    import scipy.sparse.linalg
+except ImportError:
+    scipy = None
+
 class MarkovDecisionProcess:
 
     def getStates(self):
@@ -65,3 +76,165 @@ class MarkovDecisionProcess:
         are equivalent.
         """
         abstract
+
+
+class CompiledMDP:
+    """
+    A MarkovDecisionProcess flattened into arrays so that Bellman backups can
+    be done with numpy instead of a Python loop over states.
+
+    Every (state, action) pair is a row.  The rows of state i are
+    actionStart[i]:actionStart[i+1], and the transitions of row r are the
+    entries transitionStart[r]:transitionStart[r+1] of nextStates,
+    probabilities and rewards (a CSR matrix).  States that only appear as
+    successors are indexed after the numListedStates states of getStates()
+    and have no rows, so their value stays 0.
+    """
+
+    # Without scipy, policies of mdps with at most this many states are
+    # evaluated with a dense solve (an 8 MB matrix at this size); larger
+    # ones are evaluated iteratively
+    DENSE_SOLVE_LIMIT = 1000
+
+    def __init__(self, mdp):
+        if numpy is None:
+            raise ImportError('CompiledMDP needs numpy')
+        self.states = list(mdp.getStates())
+        self.numListedStates = len(self.states)
+        self.stateIndex = dict([(state, i) for i, state in enumerate(self.states)])
+        self.rowActions = []
+        self.rowIndex = {}
+
+        actionStart = [0]
+        transitionStart = [0]
+        nextStates, probabilities, rewards = [], [], []
+        for state in self.states[:self.numListedStates]:
+            for action in mdp.getPossibleActions(state):
+                # Keyed like the Counter in ValueIterationAgent.computeQValueFromValues,
+                # so that repeated successors and the order of the sum match it
+                transitions = {}
+                for nextState, probability in mdp.getTransitionStatesAndProbs(state, action):
+                    transitions[nextState] = (probability, mdp.getReward(state, action, nextState))
+                for nextState, (probability, reward) in transitions.items():
+                    if nextState not in self.stateIndex:
+                        self.stateIndex[nextState] = len(self.states)
+                        self.states.append(nextState)
+                    nextStates.append(self.stateIndex[nextState])
+                    probabilities.append(probability)
+                    rewards.append(reward)
+                self.rowIndex[(state, action)] = len(self.rowActions)
+                self.rowActions.append((state, action))
+                transitionStart.append(len(nextStates))
+            actionStart.append(len(self.rowActions))
+
+        self.numStates = len(self.states)
+        self.numRows = len(self.rowActions)
+        self.actionStart = numpy.array(actionStart, dtype=numpy.intp)
+        self.transitionStart = numpy.array(transitionStart, dtype=numpy.intp)
+        self.nextStates = numpy.array(nextStates, dtype=numpy.intp)
+        self.probabilities = numpy.array(probabilities, dtype=numpy.float64)
+        self.rewards = numpy.array(rewards, dtype=numpy.float64)
+        self.rowStates = numpy.repeat(numpy.arange(self.numListedStates), numpy.diff(self.actionStart))
+
+        # Entry k of every row, for rows with more than k entries.  Adding these
+        # slices in turn sums each row left to right, as sum() does.
+        rowLengths = numpy.diff(self.transitionStart)
+        self.slots = []
+        for k in range(rowLengths.max() if self.numRows else 0):
+            rows = numpy.nonzero(rowLengths > k)[0]
+            self.slots.append((rows, self.transitionStart[rows] + k))
+
+        hasActions = numpy.diff(self.actionStart) > 0
+        self.statesWithActions = numpy.nonzero(hasActions)[0]
+        self.firstRows = self.actionStart[self.statesWithActions]
+
+    def getValueArray(self, values):
+        "Returns an array of values[state] for every indexed state (0 where missing)"
+        array = numpy.zeros(self.numStates)
+        for i, state in enumerate(self.states):
+            if state in values:
+                array[i] = values[state]
+        return array
+
+    def getQValues(self, values, discount):
+        "Returns the Q-value of every row given an array of state values"
+        terms = self.probabilities * (self.rewards + discount * values[self.nextStates])
+        qValues = numpy.zeros(self.numRows)
+        for rows, entries in self.slots:
+            qValues[rows] += terms[entries]
+        return qValues
+
+    def getMaxValues(self, qValues):
+        "Returns the best Q-value of every state, 0 for states without actions"
+        values = numpy.zeros(self.numStates)
+        if len(self.statesWithActions):
+            values[self.statesWithActions] = numpy.maximum.reduceat(qValues, self.firstRows)
+        return values
+
+    def backup(self, values, discount):
+        "One synchronous Bellman backup of an array of state values"
+        return self.getMaxValues(self.getQValues(values, discount))
+
+    def getGreedyRows(self, qValues, currentRows=None, tolerance=1e-10):
+        """
+        Returns the row of the best action of every state that has actions
+        (in the order of statesWithActions).  A state keeps its row from
+        currentRows unless another action is better by more than tolerance,
+        so that policy iteration does not cycle between tied actions.
+        """
+        rows = numpy.empty(len(self.statesWithActions), dtype=numpy.intp)
+        for k, state in enumerate(self.statesWithActions):
+            start, end = self.actionStart[state], self.actionStart[state + 1]
+            best = start + int(qValues[start:end].argmax())
+            if currentRows is not None and qValues[currentRows[k]] >= qValues[best] - tolerance:
+                best = currentRows[k]
+            rows[k] = best
+        return rows
+
+    def evaluatePolicy(self, policyRows, discount, values=None):
+        """
+        Returns the values of the policy that takes row policyRows[k] in
+        state statesWithActions[k], by solving (I - discount * P) V = R.
+        Uses a sparse solver when scipy is installed, and otherwise a dense
+        one up to DENSE_SOLVE_LIMIT states.  Larger mdps without scipy are
+        evaluated iteratively, starting from an array of values if given
+        (see iteratePolicyValues).
+        """
+        starts = self.transitionStart[policyRows]
+        lengths = self.transitionStart[policyRows + 1] - starts
+        entries = numpy.arange(lengths.sum()) + numpy.repeat(starts - (numpy.cumsum(lengths) - lengths), lengths)
+        sources = numpy.repeat(self.statesWithActions, lengths)
+        targets = self.nextStates[entries]
+        probabilities = self.probabilities[entries]
+
+        rewards = numpy.zeros(self.numStates)
+        numpy.add.at(rewards, sources, probabilities * self.rewards[entries])
+        if scipy is not None:
+            transitions = scipy.sparse.coo_matrix((probabilities, (sources, targets)),
+                                                  shape=(self.numStates, self.numStates))
+            system = scipy.sparse.identity(self.numStates, format='csc') - discount * transitions.tocsc()
+            return scipy.sparse.linalg.spsolve(system, rewards)
+        if self.numStates <= CompiledMDP.DENSE_SOLVE_LIMIT:
+            system = numpy.identity(self.numStates)
+            numpy.add.at(system, (sources, targets), -discount * probabilities)
+            return numpy.linalg.solve(system, rewards)
+        return self.iteratePolicyValues(sources, targets, probabilities, rewards, discount, values)
+
+    def iteratePolicyValues(self, sources, targets, probabilities, rewards, discount, values=None,
+                            tolerance=1e-12, maxSweeps=100000):
+        """
+        Iterative policy evaluation: repeats V = R + discount * P V, with P
+        given by its transitions (sources, targets, probabilities), until no
+        value changes by more than tolerance or after maxSweeps sweeps.  Each
+        sweep is one pass over the transitions of the policy.
+        """
+        if values is None:
+            values = numpy.zeros(self.numStates)
+        for sweep in xrange(maxSweeps):
+            newValues = rewards + discount * numpy.bincount(sources, weights=probabilities * values[targets],
+                                                            minlength=self.numStates)
+            converged = numpy.abs(newValues - values).max() <= tolerance
+            values = newValues
+            if converged:
+                break
+        return values
@@ -43,6 +43,7 @@ from game import GameStateData
 from game import Game
 from game import Directions
 from game import Actions
+from game import Configuration
 from util import nearestPoint
 from util import manhattanDistance
 import util, layout
@@ -71,14 +72,53 @@ class GameState:
     # Accessor methods: use these to access state data #
     ####################################################
 
-    # static variable keeps track of which states have had getLegalActions called
+    # Exploration tracking is instrumentation for grading and is off by default.
+    # When enabled, generateSuccessor records the states it is called on and
+    # creates: 'set' keeps them all, 'bounded' keeps at most exploredLimit of
+    # them, and 'count' keeps none.  exploredCount counts every recorded state.
+    exploredMode = None
+    exploredLimit = None
+    exploredCount = 0
     explored = set()
+
+    def enableExploredTracking(mode='set', limit=None):
+        if mode not in ('set', 'bounded', 'count'):
+            raise Exception('Unknown exploration tracking mode: ' + str(mode))
+        if mode == 'bounded' and limit == None:
+            raise Exception('Bounded exploration tracking needs a limit')
+        GameState.exploredMode = mode
+        GameState.exploredLimit = limit
+        GameState.explored = set()
+        GameState.exploredCount = 0
+    enableExploredTracking = staticmethod(enableExploredTracking)
+
+    def disableExploredTracking():
+        GameState.exploredMode = None
+        GameState.explored = set()
+        GameState.exploredCount = 0
+    disableExploredTracking = staticmethod(disableExploredTracking)
+
     def getAndResetExplored():
         tmp = GameState.explored.copy()
         GameState.explored = set()
+        GameState.exploredCount = 0
         return tmp
     getAndResetExplored = staticmethod(getAndResetExplored)
 
+    def getExploredCount():
+        return GameState.exploredCount
+    getExploredCount = staticmethod(getExploredCount)
+
+    def _recordExplored(*states):
+        GameState.exploredCount += len(states)
+        if GameState.exploredMode == 'set':
+            GameState.explored.update(states)
+        elif GameState.exploredMode == 'bounded':
+            for state in states:
+                if len(GameState.explored) >= GameState.exploredLimit: break
+                GameState.explored.add(state)
+    _recordExplored = staticmethod(_recordExplored)
+
     def getLegalActions( self, agentIndex=0 ):
         """
         Returns the legal actions for the agent specified.
@@ -112,7 +152,10 @@ class GameState:
         if agentIndex == 0:
             state.data.scoreChange += -TIME_PENALTY # Penalty for waiting around
         else:
-            GhostRules.decrementTimer( state.data.agentStates[agentIndex] )
+            ghostState = state.data.getMutableAgentState( agentIndex )
+            oldConfiguration = ghostState.configuration
+            GhostRules.decrementTimer( ghostState )
+            state.data.updateAgentHash( agentIndex, oldConfiguration, ghostState.configuration )
 
         # Resolve multi-agent effects
         GhostRules.checkDeath( state, agentIndex )
@@ -120,8 +163,8 @@ class GameState:
         # Book keeping
         state.data._agentMoved = agentIndex
         state.data.score += state.data.scoreChange
-        GameState.explored.add(self)
-        GameState.explored.add(state)
+        if GameState.exploredMode != None:
+            GameState._recordExplored(self, state)
         return state
 
     def getLegalPacmanActions( self ):
@@ -231,6 +274,22 @@ class GameState:
         state.data = self.data.deepCopy()
         return state
 
+    def getObservation( self ):
+        """
+        Returns the copy of the state that the Game hands to agents each turn.
+
+        Unlike deepCopy, the observation shares its layout, food, capsules and
+        agent states with this state, so it is O(1) to make.  It is read-only:
+        agents may call generateSuccessor on it (successors copy on write) but
+        must not modify what its accessors return.
+        """
+        state = GameState( self )
+        state.data._agentMoved = self.data._agentMoved
+        state.data._foodEaten = self.data._foodEaten
+        state.data._foodAdded = self.data._foodAdded
+        state.data._capsuleEaten = self.data._capsuleEaten
+        return state
+
     def __eq__( self, other ):
         """
         Allows two states to be compared.
@@ -342,11 +401,13 @@ class PacmanRules:
         if action not in legal:
             raise Exception("Illegal action " + str(action))
 
-        pacmanState = state.data.agentStates[0]
+        pacmanState = state.data.getMutableAgentState( 0 )
 
         # Update Configuration
         vector = Actions.directionToVector( action, PacmanRules.PACMAN_SPEED )
+        oldConfiguration = pacmanState.configuration
         pacmanState.configuration = pacmanState.configuration.generateSuccessor( vector )
+        state.data.updateAgentHash( 0, oldConfiguration, pacmanState.configuration )
 
         # Eat
         next = pacmanState.configuration.getPosition()
@@ -361,21 +422,21 @@ class PacmanRules:
         # Eat food
         if state.data.food[x][y]:
             state.data.scoreChange += 10
-            state.data.food = state.data.food.copy()
-            state.data.food[x][y] = False
+            state.data.getMutableFood()[x][y] = False
+            state.data.updateFoodHash( position )
             state.data._foodEaten = position
-            # TODO: cache numFood?
             numFood = state.getNumFood()
             if numFood == 0 and not state.data._lose:
                 state.data.scoreChange += 500
                 state.data._win = True
         # Eat capsule
         if( position in state.getCapsules() ):
-            state.data.capsules.remove( position )
+            state.data.getMutableCapsules().remove( position )
+            state.data.updateCapsuleHash( position )
             state.data._capsuleEaten = position
             # Reset all ghosts' scared timers
             for index in range( 1, len( state.data.agentStates ) ):
-                state.data.agentStates[index].scaredTimer = SCARED_TIME
+                state.data.getMutableAgentState( index ).scaredTimer = SCARED_TIME
     consume = staticmethod( consume )
 
 class GhostRules:
@@ -404,17 +465,21 @@ class GhostRules:
         if action not in legal:
             raise Exception("Illegal ghost action " + str(action))
 
-        ghostState = state.data.agentStates[ghostIndex]
+        ghostState = state.data.getMutableAgentState( ghostIndex )
         speed = GhostRules.GHOST_SPEED
         if ghostState.scaredTimer > 0: speed /= 2.0
         vector = Actions.directionToVector( action, speed )
+        oldConfiguration = ghostState.configuration
         ghostState.configuration = ghostState.configuration.generateSuccessor( vector )
+        state.data.updateAgentHash( ghostIndex, oldConfiguration, ghostState.configuration )
     applyAction = staticmethod( applyAction )
 
     def decrementTimer( ghostState):
         timer = ghostState.scaredTimer
         if timer == 1:
-            ghostState.configuration.pos = nearestPoint( ghostState.configuration.pos )
+            # Replace rather than mutate: configurations are shared with the parent state
+            configuration = ghostState.configuration
+            ghostState.configuration = Configuration( nearestPoint( configuration.pos ), configuration.direction )
         ghostState.scaredTimer = max( 0, timer - 1 )
     decrementTimer = staticmethod( decrementTimer )
 
@@ -436,9 +501,13 @@ class GhostRules:
     def collide( state, ghostState, agentIndex):
         if ghostState.scaredTimer > 0:
             state.data.scoreChange += 200
+            ghostState = state.data.getMutableAgentState( agentIndex )
+            oldConfiguration = ghostState.configuration
             GhostRules.placeGhost(state, ghostState)
+            state.data.updateAgentHash( agentIndex, oldConfiguration, ghostState.configuration )
             ghostState.scaredTimer = 0
             # Added for first-person
+            state.data._eaten = state.data._eaten[:] # shared with the predecessor after a ghost move
             state.data._eaten[agentIndex] = True
         else:
             if not state.data._win:
@@ -523,6 +592,8 @@ def readCommand( argv ):
                       help='Turns on exception handling and timeouts during games', default=False)
     parser.add_option('--timeout', dest='timeout', type='int',
                       help=default('Maximum length of time an agent can spend computing in a single game'), default=30)
+    parser.add_option('--workers', dest='workers', type='int',
+                      help=default('Number of processes to play the non-training games in (no graphics when > 1)'), default=1)
 
     options, otherjunk = parser.parse_args(argv)
     if len(otherjunk) != 0:
@@ -570,6 +641,7 @@ def readCommand( argv ):
     args['record'] = options.record
     args['catchExceptions'] = options.catchExceptions
     args['timeout'] = options.timeout
+    args['workers'] = options.workers
 
     # Special case: recorded games don't use the runGames method or args structure
     if options.gameToReplay != None:
@@ -625,7 +697,17 @@ def replayGame( layout, actions, display ):
 
     display.finish()
 
-def runGames( layout, pacman, ghosts, display, numGames, record, numTraining = 0, catchExceptions=False, timeout=30 ):
+def runGames( layout, pacman, ghosts, display, numGames, record, numTraining = 0, catchExceptions=False, timeout=30, workers=1, keepSummaries=False ):
+    """
+    Plays numGames games, the first numTraining of them quietly, and returns the
+    Game objects of the others.  With workers > 1 the non-training games are
+    played by runGamesInParallel, which returns a summary dict per game instead
+    (see _runParallelGame), and only if keepSummaries is set.
+    """
+    if workers > 1:
+        return runGamesInParallel( layout, pacman, ghosts, numGames, record, numTraining, catchExceptions, timeout,
+                                   workers, keepSummaries )
+
     import __main__
     __main__.__dict__['_display'] = display
 
@@ -647,12 +729,7 @@ def runGames( layout, pacman, ghosts, display, numGames, record, numTraining = 0
         if not beQuiet: games.append(game)
 
         if record:
-            import time, cPickle
-            fname = ('recorded-game-%d' % (i + 1)) +  '-'.join([str(t) for t in time.localtime()[1:6]])
-            f = file(fname, 'w')
-            components = {'layout': layout, 'actions': game.moveHistory}
-            cPickle.dump(components, f)
-            f.close()
+            recordGame( layout, game, i )
 
     if (numGames-numTraining) > 0:
         scores = [game.state.getScore() for game in games]
@@ -665,6 +742,96 @@ def runGames( layout, pacman, ghosts, display, numGames, record, numTraining = 0
 
     return games
 
+def recordGame( layout, game, gameIndex ):
+    import time, cPickle
+    fname = ('recorded-game-%d' % (gameIndex + 1)) +  '-'.join([str(t) for t in time.localtime()[1:6]])
+    f = file(fname, 'w')
+    components = {'layout': layout, 'actions': game.moveHistory}
+    cPickle.dump(components, f)
+    f.close()
+
+# The arguments of the games being played by runGamesInParallel.  Worker processes
+# inherit them when the pool forks, so agents never need to be pickled.
+_parallelGameArgs = None
+
+def _runParallelGame( gameIndex ):
+    """
+    Plays one game in a worker process and returns a small summary of it rather
+    than the Game, whose move history and states would have to be pickled.
+    What the game prints is captured into the summary's output, for the parent
+    to print in game order.
+    """
+    import textDisplay, cStringIO
+    layout, pacman, ghosts, record, catchExceptions, timeout, baseSeed = _parallelGameArgs
+    random.seed('%d-%d' % (baseSeed, gameIndex))
+    rules = ClassicGameRules(timeout)
+    rules.quiet = False
+    startTime = time.time()
+    stdout = sys.stdout
+    sys.stdout = cStringIO.StringIO()
+    try:
+        game = rules.newGame( layout, pacman, ghosts, textDisplay.NullGraphics(), False, catchExceptions )
+        game.run()
+        output = sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+    if record:
+        recordGame( layout, game, gameIndex )
+    return {'index': gameIndex,
+            'output': output,
+            'score': game.state.getScore(),
+            'win': game.state.isWin(),
+            'moves': len(game.moveHistory),
+            'agentTimes': game.totalAgentTimes,
+            'time': time.time() - startTime}
+
+def runGamesInParallel( layout, pacman, ghosts, numGames, record, numTraining, catchExceptions, timeout, workers,
+                        keepSummaries=False ):
+    """
+    Plays the training games in this process, then spreads the remaining games
+    over a pool of worker processes with NullGraphics.  Each game is seeded from
+    its index and one draw from this process's random generator, so runs with
+    --fixRandomSeed are repeatable (though they differ from a --workers 1 run).
+
+    Each game's output is printed as its summary arrives, in game order, and
+    only its score and outcome are kept for the totals.  The per-game summaries,
+    without their output, are returned if keepSummaries is set; an empty list
+    is returned otherwise.
+
+    The pool relies on fork to hand the agents to the workers.
+    """
+    global _parallelGameArgs
+    import multiprocessing
+    import textDisplay
+
+    if numTraining > 0:
+        runGames( layout, pacman, ghosts, textDisplay.NullGraphics(), min(numTraining, numGames), record,
+                  numTraining, catchExceptions, timeout )
+
+    _parallelGameArgs = (layout, pacman, ghosts, record, catchExceptions, timeout, random.getrandbits(32))
+    pool = multiprocessing.Pool(workers)
+    summaries = []
+    scores, wins = [], []
+    try:
+        for summary in pool.imap( _runParallelGame, range(numTraining, numGames) ):
+            sys.stdout.write(summary.pop('output'))
+            scores.append(summary['score'])
+            wins.append(summary['win'])
+            if keepSummaries:
+                summaries.append(summary)
+    finally:
+        pool.close()
+        pool.join()
+        _parallelGameArgs = None
+
+    if scores:
+        print 'Average Score:', sum(scores) / float(len(scores))
+        print 'Scores:       ', ', '.join([str(score) for score in scores])
+        print 'Win Rate:      %d/%d (%.2f)' % (wins.count(True), len(wins), wins.count(True) / float(len(wins)))
+        print 'Record:       ', ', '.join([ ['Loss', 'Win'][int(w)] for w in wins])
+
+    return summaries
+
 if __name__ == '__main__':
     """
     The main function called when pacman.py is run
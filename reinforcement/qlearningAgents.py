@@ -17,6 +17,12 @@ from learningAgents import ReinforcementAgent
 from featureExtractors import *
 
 import random, util, math
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class QLearningAgent(ReinforcementAgent):
@@ -40,11 +46,18 @@ class QLearningAgent(ReinforcementAgent):
           which returns legal actions for a state
     """
 
-    def __init__(self, **args):
-        "You can initialize Q-values here..."
+    def __init__(self, qTable=False, **args):
+        """
+        You can initialize Q-values here...
+
+        qTable - keep the Q-values in a QTable instead of a dict of dicts
+        """
         ReinforcementAgent.__init__(self, **args)
 
         self.qValues = dict()
+        self.qTable = None
+        if qTable not in (False, None, 0, '0', 'False', 'false'):
+            self.qTable = QTable()
 
     def getQValue(self, state, action):
         """
@@ -52,6 +65,9 @@ class QLearningAgent(ReinforcementAgent):
           Should return 0.0 if we have never seen a state
           or the Q node value otherwise
         """
+        if self.qTable is not None:
+            return self.qTable.getValue(state, action)
+
         if state not in self.qValues:
             return 0.0
 
@@ -73,6 +89,9 @@ class QLearningAgent(ReinforcementAgent):
         if len(legalActions) == 0:
             return 0.0
 
+        if self.qTable is not None:
+            return max(self.qTable.getValues(state, legalActions))
+
         # Iterate over all legal actions in the state
         # while keeping track of the highest Q value,
         # then return that highest Q value.
@@ -99,13 +118,28 @@ class QLearningAgent(ReinforcementAgent):
         if len(legalActions) == 1:
             return legalActions[0]
 
+        if self.qTable is not None:
+            qValues = self.qTable.getValues(state, legalActions)
+        else:
+            qValues = [self.getQValue(state, action) for action in legalActions]
+        return self.chooseBestAction(legalActions, qValues)
+
+    def chooseBestAction(self, legalActions, qValues):
+        """
+          Returns the legal action with the highest of qValues, breaking
+          ties at random.
+        """
+        # Without repeated values no tie can come up, and the loop
+        # below would return the first maximum
+        if len(set(qValues)) == len(qValues):
+            return legalActions[qValues.index(max(qValues))]
+
         # Iterate over all legal actions in the state
         # while keeping track of the highest Q value and the corresponding action,
         # then return that action.
         bestAction = None
         maxQValue = float("-Inf")
-        for action in legalActions:
-            qValue = self.getQValue(state, action)
+        for action, qValue in zip(legalActions, qValues):
             if qValue > maxQValue:
                 maxQValue = qValue
                 bestAction = action
@@ -149,6 +183,12 @@ class QLearningAgent(ReinforcementAgent):
           it will be called on your behalf
         """
 
+        if self.qTable is not None:
+            sample = reward + self.discount * self.computeValueFromQValues(nextState)
+            oldValue = self.qTable.getValue(state, action)
+            self.qTable.setValue(state, action, (1.0 - self.alpha) * oldValue + self.alpha * sample)
+            return
+
         # Make sure we do not get a key-error.
         if state not in self.qValues:
             self.qValues[state] = dict()
@@ -166,6 +206,149 @@ class QLearningAgent(ReinforcementAgent):
         return self.computeValueFromQValues(state)
 
 
+class QTable:
+    """
+      Tabular Q-values in one flat array('d') with a row per state and a
+      column per action.  States and actions are numbered the first time
+      they are seen; values that were never set are 0.0.  Rows are added
+      as states appear and the table is widened when a new action does.
+    """
+
+    def __init__(self):
+        self.stateRows = {}
+        self.actionColumns = {}
+        self.columnCache = {}
+        self.numColumns = 0
+        self.values = array('d')
+
+    def getValue(self, state, action):
+        row = self.stateRows.get(state)
+        column = self.actionColumns.get(action)
+        if row is None or column is None:
+            return 0.0
+        return self.values[row * self.numColumns + column]
+
+    def getValues(self, state, actions):
+        """
+          Returns the Q-values of state for each of actions, as a slice of
+          the table when the actions have adjacent columns.
+        """
+        try:
+            columns = self.columnCache[actions]
+        except (KeyError, TypeError):
+            columns = self.getColumns(actions)
+        row = self.stateRows.get(state)
+        if row is None:
+            return [0.0] * len(actions)
+        offset = row * self.numColumns
+        if type(columns) == tuple:
+            return self.values[offset + columns[0]:offset + columns[1]]
+        return [self.values[offset + column] for column in columns]
+
+    def setValue(self, state, action, value):
+        column = self.getColumn(action)
+        row = self.stateRows.get(state)
+        if row is None:
+            row = self.stateRows[state] = len(self.stateRows)
+            self.values.extend(array('d', [0.0]) * self.numColumns)
+        self.values[row * self.numColumns + column] = value
+
+    def getColumn(self, action):
+        column = self.actionColumns.get(action)
+        if column is None:
+            column = self.actionColumns[action] = self.numColumns
+            if self.values:
+                widened = array('d')
+                for offset in range(0, len(self.values), self.numColumns):
+                    widened.extend(self.values[offset:offset + self.numColumns])
+                    widened.append(0.0)
+                self.values = widened
+            self.numColumns += 1
+        return column
+
+    def getColumns(self, actions):
+        """
+          The columns of a sequence of actions, as a (start, stop) pair
+          when they are adjacent and in order, otherwise as a list.
+        """
+        key = tuple(actions)
+        columns = self.columnCache.get(key)
+        if columns is None:
+            columns = [self.getColumn(action) for action in actions]
+            if columns and columns == range(columns[0], columns[0] + len(columns)):
+                columns = (columns[0], columns[0] + len(columns))
+            self.columnCache[key] = columns
+        return columns
+
+
+class ReplayBuffer:
+    """
+      A ring buffer of the last `capacity` transitions an ApproximateQAgent
+      learned from, kept in numpy arrays allocated up front so a mini-batch
+      of them can be replayed at once.  Row i holds the sparse features of
+      (state, action), the reward, and the features of each legal action
+      of the next state.  Feature vectors are padded with feature 0 at
+      value 0, which adds nothing to a dot product, and the arrays widen
+      when a longer vector or more actions come along.
+    """
+    def __init__(self, capacity, numFeatures=8, numActions=5):
+        self.capacity = capacity
+        self.size = 0
+        self.position = 0
+        self.indices = numpy.zeros((capacity, numFeatures), dtype=numpy.intp)
+        self.values = numpy.zeros((capacity, numFeatures))
+        self.rewards = numpy.zeros(capacity)
+        self.nextIndices = numpy.zeros((capacity, numActions, numFeatures), dtype=numpy.intp)
+        self.nextValues = numpy.zeros((capacity, numActions, numFeatures))
+        self.nextLegal = numpy.zeros((capacity, numActions), dtype=bool)
+
+    def __len__(self):
+        return self.size
+
+    def widen(self, numFeatures, numActions):
+        "Grows the arrays to hold numFeatures features and numActions next actions a row"
+        numFeatures = max(numFeatures, self.values.shape[1])
+        numActions = max(numActions, self.nextLegal.shape[1])
+        def grow(old, shape):
+            new = numpy.zeros(shape, dtype=old.dtype)
+            new[tuple([slice(0, n) for n in old.shape])] = old
+            return new
+        self.indices = grow(self.indices, (self.capacity, numFeatures))
+        self.values = grow(self.values, (self.capacity, numFeatures))
+        self.nextIndices = grow(self.nextIndices, (self.capacity, numActions, numFeatures))
+        self.nextValues = grow(self.nextValues, (self.capacity, numActions, numFeatures))
+        self.nextLegal = grow(self.nextLegal, (self.capacity, numActions))
+
+    def add(self, indices, values, reward, nextFeatures):
+        """
+          Stores a transition over the oldest one once the buffer is full.
+          nextFeatures is a list of (indices, values) pairs, one for each
+          legal action of the next state (none when it is terminal).
+        """
+        numFeatures = max([len(indices)] + [len(i) for i, _ in nextFeatures])
+        if numFeatures > self.values.shape[1] or len(nextFeatures) > self.nextLegal.shape[1]:
+            self.widen(numFeatures, len(nextFeatures))
+        row = self.position
+        self.indices[row] = 0
+        self.values[row] = 0
+        self.indices[row, :len(indices)] = indices
+        self.values[row, :len(values)] = values
+        self.rewards[row] = reward
+        self.nextIndices[row] = 0
+        self.nextValues[row] = 0
+        self.nextLegal[row] = False
+        for action, (indices, values) in enumerate(nextFeatures):
+            self.nextIndices[row, action, :len(indices)] = indices
+            self.nextValues[row, action, :len(values)] = values
+            self.nextLegal[row, action] = True
+        self.position = (row + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def sample(self, batchSize, rand):
+        "Returns the rows of batchSize transitions drawn uniformly, with replacement"
+        return rand.randint(0, self.size, batchSize)
+
+
 class PacmanQAgent(QLearningAgent):
     "Exactly the same as QLearningAgent, but with different default parameters"
 
@@ -205,36 +388,199 @@ class ApproximateQAgent(PacmanQAgent):
        You should only have to overwrite getQValue
        and update.  All other QLearningAgent functions
        should work as is.
+
+       The weights are a util.Counter keyed by feature name, multiplied
+       with the extractor's feature Counters.
+
+       With sparse=1, features are numbered by a FeatureIndex instead and
+       the weights are a numpy array indexed by those numbers, which
+       doubles in size when new features appear.  The Q-values of all
+       legal actions of a state come from one batched dot product (see
+       getQValues).  With Pacman's few actions and features per state,
+       numpy's cost per call makes this no faster than the Counters; it
+       is there for experience replay, which needs it.
+
+       With a replayRatio above 0, transitions also go into a ReplayBuffer
+       and each one is followed by replayRatio mini-batch updates on
+       transitions drawn from it (see replay).  Replay implies sparse=1
+       and needs numpy.
     """
 
-    def __init__(self, extractor='IdentityExtractor', **args):
+    def __init__(self, extractor='IdentityExtractor', featureCacheSize=1000,
+                 sparse=0, replayRatio=0, replaySize=10000, replayBatch=32, **args):
+        """
+        featureCacheSize - how many (state, action) feature vectors to keep
+                           in a CachingExtractor (0 turns the cache off)
+        sparse           - 1 keeps the weights in a numpy array
+        replayRatio      - mini-batches replayed per transition; fractions
+                           replay every few transitions (0 turns replay off)
+        replaySize       - how many transitions the replay buffer keeps
+        replayBatch      - transitions per replayed mini-batch
+        """
+        self.sparse = int(sparse) != 0 or float(replayRatio) > 0
+        if numpy is None and self.sparse:
+            raise ImportError('sparse weights and experience replay need numpy')
         self.featExtractor = util.lookup(extractor, globals())()
+        if int(featureCacheSize) > 0:
+            self.featExtractor = CachingExtractor(self.featExtractor, int(featureCacheSize))
+        args.pop('qTable', None) # the weights take the place of the table
         PacmanQAgent.__init__(self, **args)
-        self.weights = util.Counter()
+        if not self.sparse:
+            self.weights = util.Counter()
+        else:
+            self.featureIndex = FeatureIndex()
+            self.weightArray = numpy.zeros(64)
+        self.replayRatio = float(replayRatio)
+        self.replayBatch = int(replayBatch)
+        self.replayCredit = 0.0
+        self.replayBuffer = None
+        if self.replayRatio > 0:
+            self.replayBuffer = ReplayBuffer(int(replaySize))
+            self.replayRandom = numpy.random.RandomState(random.randint(0, 2 ** 31 - 1))
 
     def getWeights(self):
-        return self.weights
+        """
+          Returns the weights as a Counter keyed by feature name.  Features
+          whose weight is 0 are left out; the Counter gives 0 for them anyway.
+        """
+        if not self.sparse:
+            return self.weights
+
+        weights = util.Counter()
+        for id, name in enumerate(self.featureIndex.names):
+            if self.weightArray[id] != 0:
+                weights[name] = float(self.weightArray[id])
+        return weights
+
+    def growWeights(self):
+        "Makes room in the weight array for every feature numbered so far"
+        if len(self.featureIndex) > len(self.weightArray):
+            size = len(self.weightArray)
+            while size < len(self.featureIndex):
+                size *= 2
+            weights = numpy.zeros(size)
+            weights[:len(self.weightArray)] = self.weightArray
+            self.weightArray = weights
+
+    def getFeatureVector(self, state, action):
+        "Returns the features of (state, action) as arrays of ids and values"
+        indices, values = self.featExtractor.getSparseFeatures(state, action, self.featureIndex)
+        self.growWeights()
+        return numpy.array(indices, dtype=numpy.intp), numpy.array(values, dtype=float)
 
     def getQValue(self, state, action):
         """
           Should return Q(state,action) = w * featureVector
           where * is the dotProduct operator
         """
-        "*** YOUR CODE HERE ***"
-        util.raiseNotDefined()
+        if not self.sparse:
+            return self.weights * self.featExtractor.getFeatures(state, action)
+
+        indices, values = self.getFeatureVector(state, action)
+        return float(numpy.dot(self.weightArray[indices], values))
+
+    def getQValues(self, state, actions):
+        """
+          Returns an array of the Q-values of each of actions in state,
+          computed together from the concatenated feature vectors.
+        """
+        allIndices, allValues, lengths = [], [], []
+        for action in actions:
+            indices, values = self.featExtractor.getSparseFeatures(state, action, self.featureIndex)
+            allIndices += indices
+            allValues += values
+            lengths.append(len(indices))
+        self.growWeights()
+        products = self.weightArray[numpy.array(allIndices, dtype=numpy.intp)] * numpy.array(allValues, dtype=float)
+        if len(products) == len(actions) and min(lengths) == 1:
+            return products
+        owners = numpy.repeat(numpy.arange(len(actions)), lengths)
+        return numpy.bincount(owners, weights=products, minlength=len(actions))
+
+    def computeValueFromQValues(self, state):
+        if not self.sparse:
+            return PacmanQAgent.computeValueFromQValues(self, state)
+        legalActions = self.getLegalActions(state)
+        if len(legalActions) == 0:
+            return 0.0
+        return float(self.getQValues(state, legalActions).max())
+
+    def computeActionFromQValues(self, state):
+        if not self.sparse:
+            return PacmanQAgent.computeActionFromQValues(self, state)
+        legalActions = self.getLegalActions(state)
+        if len(legalActions) == 0:
+            return None
+        if len(legalActions) == 1:
+            return legalActions[0]
+        return self.chooseBestAction(legalActions, self.getQValues(state, legalActions).tolist())
 
     def update(self, state, action, nextState, reward):
         """
            Should update your weights based on transition
         """
-        "*** YOUR CODE HERE ***"
-        util.raiseNotDefined()
+        if not self.sparse:
+            features = self.featExtractor.getFeatures(state, action)
+            sample = reward + self.discount * self.computeValueFromQValues(nextState)
+            difference = sample - self.weights * features
+            for feature, value in features.items():
+                self.weights[feature] += self.alpha * difference * value
+            return
+
+        indices, values = self.getFeatureVector(state, action)
+        sample = reward + self.discount * self.computeValueFromQValues(nextState)
+        difference = sample - float(numpy.dot(self.weightArray[indices], values))
+        # Feature ids within one vector are distinct, so no add.at is needed
+        self.weightArray[indices] += self.alpha * difference * values
+
+        if self.replayBuffer is not None and self.alpha != 0:
+            nextFeatures = [self.featExtractor.getSparseFeatures(nextState, nextAction, self.featureIndex)
+                            for nextAction in self.getLegalActions(nextState)]
+            self.replayBuffer.add(indices, values, reward, nextFeatures)
+            self.replayCredit += self.replayRatio
+            while self.replayCredit >= 1:
+                self.replayCredit -= 1
+                self.replay(self.replayBuffer.sample(self.replayBatch, self.replayRandom))
+
+    def replay(self, rows):
+        """
+          One update on the replay buffer transitions in rows, all made
+          from the same weights: the Q-values, next-state values and
+          differences of the whole batch are computed as arrays.  Each
+          weight moves by alpha times its mean gradient over the
+          transitions that have its feature, so a feature seen once in
+          the batch gets the step an online update would give it, and
+          one seen in every transition (like a bias) is not moved
+          batch-size times as far.
+        """
+        buffer = self.replayBuffer
+        weights = self.weightArray
+        indices, values = buffer.indices[rows], buffer.values[rows]
+        qValues = (weights[indices] * values).sum(1)
+        nextQValues = (weights[buffer.nextIndices[rows]] * buffer.nextValues[rows]).sum(2)
+        legal = buffer.nextLegal[rows]
+        nextQValues[~legal] = -numpy.inf
+        nextValues = numpy.where(legal.any(1), nextQValues.max(1), 0.0)
+        differences = buffer.rewards[rows] + self.discount * nextValues - qValues
+        indices = indices.ravel()
+        gradient = numpy.bincount(indices, weights=(differences[:, None] * values).ravel(), minlength=len(weights))
+        counts = numpy.bincount(indices, weights=(values != 0).ravel(), minlength=len(weights))
+        self.weightArray += self.alpha * gradient / numpy.maximum(counts, 1)
 
     def final(self, state):
         "Called at the end of each game."
         # call the super-class final method
         PacmanQAgent.final(self, state)
 
+        if isinstance(self.featExtractor, CachingExtractor) and \
+                (self.episodesSoFar % 100 == 0 or self.episodesSoFar == self.numTraining):
+            if self.sparse:
+                cache = self.featExtractor.sparseCache
+            else:
+                cache = self.featExtractor.cache
+            print '\tFeature cache: %d hits, %d misses (%.1f%% hit rate)' % (
+                    cache.hits, cache.misses, 100 * cache.getHitRate())
+
         # did we finish training?
         if self.episodesSoFar == self.numTraining:
             # you might want to print your weights here for debugging
@@ -13,8 +13,8 @@
 
 
 import testClasses
-import random, math, traceback, sys, os
-import layout, textDisplay, pacman, gridworld
+import random, math, traceback, sys, os, heapq
+import layout, textDisplay, pacman, gridworld, util, featureExtractors
 import time
 from util import Counter, TimeoutFunction, FixedRandom
 from collections import defaultdict
@@ -42,6 +42,7 @@ class ValueIterationTest(testClasses.TestCase):
         self.testOutFile = testDict['test_out_file']
         if maxPreIterations < iterations:
             self.numsIterationsForDisplay.append(iterations)
+        self.steppedAgent = None
 
     def writeFailureFile(self, string):
         with open(self.testOutFile, 'w') as handle:
@@ -119,8 +120,25 @@ class ValueIterationTest(testClasses.TestCase):
             handle.write(self.prettyValueSolutionString('actions', '\n'.join(actions) + '\n'))
         return True
 
+    def getAgentAfter(self, moduleDict, numIterations):
+        """
+        Returns a ValueIterationAgent that has run numIterations iterations.  The
+        numbers of iterations are checked in increasing order, so an agent with
+        a step() method is kept and advanced instead of being rebuilt each time.
+        """
+        agentClass = moduleDict['valueIterationAgents'].ValueIterationAgent
+        if not hasattr(agentClass, 'step'):
+            return agentClass(self.grid, discount=self.discount, iterations=numIterations)
+        agent = self.steppedAgent
+        if agent is None or agent.__class__ is not agentClass or agent.sweeps > numIterations:
+            agent = agentClass(self.grid, discount=self.discount, iterations=0)
+        while agent.sweeps < numIterations:
+            agent.step()
+        self.steppedAgent = agent
+        return agent
+
     def runAgent(self, moduleDict, numIterations):
-        agent = moduleDict['valueIterationAgents'].ValueIterationAgent(self.grid, discount=self.discount, iterations=numIterations)
+        agent = self.getAgentAfter(moduleDict, numIterations)
         states = self.grid.getStates()
         actions = list(reduce(lambda a, b: set(a).union(b), [self.grid.getPossibleActions(state) for state in states]))
         values = {}
@@ -922,3 +940,118 @@ class GridPolicyTest(testClasses.TestCase):
             handle.write('# File intentionally blank.\n')
         return True
 
+
+# The tests below check fast paths in util and featureExtractors against the
+# code they replaced.  They are not part of the project's grade; run them with
+#   python autograder.py --test-directory fastpath_test_cases
+
+class LinearScanPriorityQueue:
+    """
+      The util.PriorityQueue before decrease-key was indexed: update is a
+      linear scan of the heap followed by a full heapify.
+    """
+    def __init__(self):
+        self.heap = []
+        self.count = 0
+
+    def push(self, item, priority):
+        heapq.heappush(self.heap, (priority, self.count, item))
+        self.count += 1
+
+    def pop(self):
+        (_, _, item) = heapq.heappop(self.heap)
+        return item
+
+    def isEmpty(self):
+        return len(self.heap) == 0
+
+    def update(self, item, priority):
+        for index, (p, c, i) in enumerate(self.heap):
+            if i == item:
+                if p <= priority:
+                    break
+                del self.heap[index]
+                self.heap.append((priority, c, item))
+                heapq.heapify(self.heap)
+                break
+        else:
+            self.push(item, priority)
+
+
+class PriorityQueueOrderTest(testClasses.TestCase):
+
+    def __init__(self, question, testDict):
+        super(PriorityQueueOrderTest, self).__init__(question, testDict)
+        self.seed = int(testDict['seed'])
+        self.operations = int(testDict['operations'])
+        self.items = int(testDict['items'])
+        self.maxPriority = int(testDict['maxPriority'])
+        self.hashable = testDict.get('hashable', 'True') == 'True'
+
+    def execute(self, grades, moduleDict, solutionDict):
+        queues = [util.PriorityQueue(), LinearScanPriorityQueue()]
+        popped = [[], []]
+        rand = random.Random(self.seed)
+        for operation in range(self.operations):
+            if rand.random() < 0.3 and not queues[1].isEmpty():
+                for queue, items in zip(queues, popped):
+                    items.append(queue.pop())
+            else:
+                item = rand.randrange(self.items)
+                if not self.hashable:
+                    item = [item]
+                priority = rand.randrange(self.maxPriority)
+                for queue in queues:
+                    queue.update(item, priority)
+            if queues[0].isEmpty() != queues[1].isEmpty():
+                self.addMessage('isEmpty() differs after %d operations' % (operation + 1))
+                return self.testFail(grades)
+        for queue, items in zip(queues, popped):
+            while not queue.isEmpty():
+                items.append(queue.pop())
+        if popped[0] != popped[1]:
+            self.addMessage('popped:             %s' % popped[0][:20])
+            self.addMessage('linear scan popped: %s' % popped[1][:20])
+            return self.testFail(grades)
+        self.addMessage('%d items popped in the same order as the linear scan queue' % len(popped[0]))
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        with open(filePath, 'w') as handle:
+            handle.write('# This is the solution file for %s.\n' % self.path)
+            handle.write('# File intentionally blank.\n')
+        return True
+
+
+class FoodDistancesTest(testClasses.TestCase):
+
+    def __init__(self, question, testDict):
+        super(FoodDistancesTest, self).__init__(question, testDict)
+        self.layoutName = testDict['layoutName']
+        self.seed = int(testDict['seed'])
+
+    def execute(self, grades, moduleDict, solutionDict):
+        # Eat the pellets one at a time in a random order; each field after
+        # the first is patched from the one before it
+        walls = layout.getLayout(self.layoutName).walls
+        food = layout.getLayout(self.layoutName).food
+        pellets = food.asList()
+        random.Random(self.seed).shuffle(pellets)
+        distances = featureExtractors.FoodDistances()
+        for eaten in range(len(pellets) + 1):
+            if eaten > 0:
+                food = food.copy()
+                x, y = pellets[eaten - 1]
+                food[x][y] = False
+            if distances.getField(food, walls) != distances.searchField(food, walls):
+                self.addMessage('field differs from a full search after %d of %d pellets were eaten'
+                                % (eaten, len(pellets)))
+                return self.testFail(grades)
+        self.addMessage('%d patched fields matched a full search' % len(pellets))
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        with open(filePath, 'w') as handle:
+            handle.write('# This is the solution file for %s.\n' % self.path)
+            handle.write('# File intentionally blank.\n')
+        return True
@@ -15,6 +15,7 @@
 import sys
 import inspect
 import heapq, random
+import collections
 import cStringIO
 
 
@@ -137,11 +138,12 @@ class Stack:
 class Queue:
     "A container with a first-in-first-out (FIFO) queuing policy."
     def __init__(self):
-        self.list = []
+        # A deque gives O(1) enqueue; list.insert(0, item) was O(n)
+        self.list = collections.deque()
 
     def push(self,item):
         "Enqueue the 'item' into the queue"
-        self.list.insert(0,item)
+        self.list.appendleft(item)
 
     def pop(self):
         """
@@ -161,29 +163,74 @@ class PriorityQueue:
       in quick retrieval of the lowest-priority item in the queue. This
       data structure allows O(1) access to the lowest-priority item.
 
-      Note that this PriorityQueue does not allow you to change the priority
-      of an item.  However, you may insert the same item multiple times with
-      different priorities.
+      Hashable items are indexed by their most recent heap entry, so update()
+      is a decrease-key in O(log n): the old entry is marked removed and
+      skipped when it reaches the top of the heap (lazy deletion).
     """
+    REMOVED = object()
+
     def  __init__(self):
         self.heap = []
         self.count = 0
+        self.entryFinder = {}
+        self.size = 0
 
     def push(self, item, priority):
-        # FIXME: restored old behaviour to check against old results better
-        # FIXED: restored to stable behaviour
-        entry = (priority, self.count, item)
-        # entry = (priority, item)
+        entry = [priority, self.count, item]
         heapq.heappush(self.heap, entry)
         self.count += 1
+        self.size += 1
+        try:
+            self.entryFinder[item] = entry
+        except TypeError:
+            # Unhashable items can still be queued, they just are not indexed
+            pass
 
     def pop(self):
-        (_, _, item) = heapq.heappop(self.heap)
-        #  (_, item) = heapq.heappop(self.heap)
-        return item
+        while self.heap:
+            entry = heapq.heappop(self.heap)
+            item = entry[2]
+            if item is PriorityQueue.REMOVED:
+                continue
+            self.size -= 1
+            try:
+                if self.entryFinder.get(item) is entry:
+                    del self.entryFinder[item]
+            except TypeError:
+                pass
+            return item
+        raise IndexError('pop from empty priority queue')
 
     def isEmpty(self):
-        return len(self.heap) == 0
+        return self.size == 0
+
+    def update(self, item, priority):
+        # If item already in priority queue with higher priority, update its priority.
+        # If item already in priority queue with equal or lower priority, do nothing.
+        # If item not in priority queue, do the same thing as self.push.
+        try:
+            entry = self.entryFinder.get(item)
+        except TypeError:
+            return self._updateUnindexed(item, priority)
+        if entry is None:
+            self.push(item, priority)
+        elif priority < entry[0]:
+            # Keep the original insertion count so ties break as before
+            entry[2] = PriorityQueue.REMOVED
+            newEntry = [priority, entry[1], item]
+            heapq.heappush(self.heap, newEntry)
+            self.entryFinder[item] = newEntry
+
+    def _updateUnindexed(self, item, priority):
+        for entry in self.heap:
+            if entry[2] is not PriorityQueue.REMOVED and entry[2] == item:
+                if entry[0] <= priority:
+                    break
+                entry[2] = PriorityQueue.REMOVED
+                heapq.heappush(self.heap, [priority, entry[1], item])
+                break
+        else:
+            self.push(item, priority)
 
 class PriorityQueueWithFunction(PriorityQueue):
     """
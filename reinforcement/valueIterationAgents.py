@@ -14,55 +14,67 @@
 
 import mdp, util
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from learningAgents import ValueEstimationAgent
+from mdp import CompiledMDP
 
 
-class ValueIterationAgent(ValueEstimationAgent):
+class MDPValueAgent(ValueEstimationAgent):
     """
-        * Please read learningAgents.py before reading this.*
+        The common part of the agents below.  They compute the value
+        of every state of an mdp on initialization (see
+        runValueIteration) and then act greedily on those values.
 
-        A ValueIterationAgent takes a Markov decision process
-        (see mdp.py) on initialization and runs value iteration
-        for a given number of iterations using the supplied
-        discount factor.
+        The work done is left in self.sweeps and self.backups (the
+        number of times the max over actions was computed for a state).
     """
 
-    def __init__(self, mdp, discount=0.9, iterations=100):
-        """
-          Your value iteration agent should take an mdp on
-          construction, run the indicated number of iterations
-          and then act according to the resulting policy.
-
-          Some useful mdp methods you will use:
-              mdp.getStates()
-              mdp.getPossibleActions(state)
-              mdp.getTransitionStatesAndProbs(state, action)
-              mdp.getReward(state, action, nextState)
-              mdp.isTerminal(state)
-        """
+    def __init__(self, mdp, discount=0.9, iterations=100, epsilon=None):
         self.mdp = mdp
         self.discount = discount
         self.iterations = iterations
+        self.epsilon = epsilon
+        self.sweeps = 0
+        self.backups = 0
+        self.residual = None
 
         self.values = util.Counter()
         self.qvalues = util.Counter()
         self.policy = dict()
 
-        for i in range(0, iterations):
-            self.values = self.doIteration()
+        self.runValueIteration()
 
-    def doIteration(self):
+    def runValueIteration(self):
+        "Computes self.values"
+        raise NotImplementedError()
+
+    def valuesFromArray(self, array):
         """
-            Does an iteration and returns the newly computed values.
+            Returns a Counter of the values of every state of the compiled mdp.
+            States without actions get 0, like doIteration gives them.
         """
+        compiled = self.compiledMdp
         values = util.Counter()
-        for state in self.mdp.getStates():
-            expectedActionRewards = self.computeExpectedActionRewards(state)
-            bestAction = expectedActionRewards.argMax()
-            values[state] = expectedActionRewards[bestAction]
-
+        for i in range(compiled.numListedStates):
+            if compiled.actionStart[i] == compiled.actionStart[i + 1]:
+                values[compiled.states[i]] = 0
+            else:
+                values[compiled.states[i]] = float(array[i])
         return values
 
+    def computeBestValue(self, state):
+        """
+            The highest Q value of state given self.values, 0 if
+            state has no actions.
+        """
+        expectedActionRewards = self.computeExpectedActionRewards(state)
+        bestAction = expectedActionRewards.argMax()
+        return expectedActionRewards[bestAction]
+
     def computeExpectedActionRewards(self, state):
         """
             Computes the Q values for each possible action
@@ -120,3 +132,232 @@ class ValueIterationAgent(ValueEstimationAgent):
 
     def getQValue(self, state, action):
         return self.computeQValueFromValues(state, action)
+
+
+class ValueIterationAgent(MDPValueAgent):
+    """
+        * Please read learningAgents.py before reading this.*
+
+        A ValueIterationAgent takes a Markov decision process
+        (see mdp.py) on initialization and runs value iteration
+        for a given number of iterations using the supplied
+        discount factor.
+    """
+
+    def __init__(self, mdp, discount=0.9, iterations=100, vectorized=False, epsilon=None):
+        """
+          Your value iteration agent should take an mdp on
+          construction, run the indicated number of iterations
+          and then act according to the resulting policy.
+
+          Some useful mdp methods you will use:
+              mdp.getStates()
+              mdp.getPossibleActions(state)
+              mdp.getTransitionStatesAndProbs(state, action)
+              mdp.getReward(state, action, nextState)
+              mdp.isTerminal(state)
+
+          With vectorized=True the sweeps are done with numpy on a
+          CompiledMDP (see mdp.py); the resulting values are the same.
+          With an epsilon, iterations is only an upper bound: value
+          iteration stops after the first sweep that changes no value
+          by more than epsilon.
+
+          The work done is left in self.sweeps and self.backups.
+          Unlike the prioritized sweeping and policy iteration agents,
+          value iteration runs in whole sweeps and can be advanced one
+          more at a time with step().
+        """
+        self.vectorized = vectorized
+        self.valueArray = None
+        MDPValueAgent.__init__(self, mdp, discount, iterations, epsilon)
+
+    def runValueIteration(self):
+        """
+            Runs synchronous sweeps, each computed from the values
+            of the previous one.
+        """
+        for i in range(0, self.iterations):
+            self.sweep()
+            if self.isConverged():
+                break
+        if self.vectorized and self.sweeps:
+            self.values = self.valuesFromArray(self.valueArray)
+
+    def step(self):
+        """
+            Runs one more sweep on top of the current values, so that
+            callers can follow value iteration one iteration at a time
+            (see gridworld.py --valueSteps).  After n steps from
+            iterations=0 the agent is the same as one built with
+            iterations=n.
+        """
+        self.sweep()
+        if self.vectorized:
+            self.values = self.valuesFromArray(self.valueArray)
+
+    def sweep(self):
+        """
+            One synchronous sweep.  The vectorized version only updates
+            self.valueArray; runValueIteration and step copy it back.
+        """
+        if self.vectorized:
+            return self.sweepVectorized()
+        values = self.doIteration()
+        self.sweeps += 1
+        self.backups += len(values)
+        self.residual = max([abs(values[state] - self.values[state]) for state in values] or [0])
+        self.values = values
+
+    def isConverged(self):
+        "True once the last sweep changed no value by more than epsilon"
+        return self.epsilon is not None and self.residual <= self.epsilon
+
+    def sweepVectorized(self):
+        """
+            A synchronous sweep over a CompiledMDP, which is built on
+            the first call.
+        """
+        if self.valueArray is None:
+            self.compiledMdp = CompiledMDP(self.mdp)
+            self.valueArray = self.compiledMdp.getValueArray(self.values)
+        compiled = self.compiledMdp
+        values = compiled.backup(self.valueArray, self.discount)
+        self.sweeps += 1
+        self.backups += compiled.numListedStates
+        self.residual = compiled.numStates and float(numpy.abs(values - self.valueArray).max()) or 0
+        self.valueArray = values
+
+    def doIteration(self):
+        """
+            Does an iteration and returns the newly computed values.
+        """
+        values = util.Counter()
+        for state in self.mdp.getStates():
+            values[state] = self.computeBestValue(state)
+
+        return values
+
+class GaussSeidelValueIterationAgent(ValueIterationAgent):
+    """
+        Value iteration that updates self.values in place (Gauss-Seidel),
+        so every backup in a sweep already uses the values backed up
+        before it in that sweep.  This usually needs fewer sweeps than
+        synchronous value iteration to get within epsilon.
+    """
+
+    def __init__(self, mdp, discount=0.9, iterations=100, epsilon=None):
+        ValueIterationAgent.__init__(self, mdp, discount, iterations, epsilon=epsilon)
+
+    def sweep(self):
+        states = self.mdp.getStates()
+        self.residual = 0
+        for state in states:
+            value = self.computeBestValue(state)
+            self.residual = max(self.residual, abs(value - self.values[state]))
+            self.values[state] = value
+        self.sweeps += 1
+        self.backups += len(states)
+
+
+class PrioritizedSweepingValueIterationAgent(MDPValueAgent):
+    """
+        Value iteration that backs up the state with the largest Bellman
+        residual |max_a Q(s, a) - V(s)| first and skips states whose
+        residual is at most epsilon.
+
+        Residuals are computed exactly once at the start.  After that,
+        when V(s) changes by delta the residual of each predecessor p can
+        grow by at most discount * max_a T(p, a, s) * |delta|, so that
+        bound is added to p's priority instead of backing p up again.
+        When the queue runs dry no residual is above epsilon.
+
+        iterations bounds the work to iterations * len(states) backups;
+        self.sweeps reports the backups done in units of full sweeps.
+    """
+
+    def __init__(self, mdp, discount=0.9, iterations=100, epsilon=1e-5):
+        MDPValueAgent.__init__(self, mdp, discount, iterations, epsilon)
+
+    def computePredecessors(self, states):
+        """
+            Returns a dict from each state to a dict of the states that
+            reach it in one step and their largest transition probability.
+        """
+        predecessors = dict([(state, {}) for state in states])
+        for state in states:
+            for action in self.mdp.getPossibleActions(state):
+                for nextState, probability in self.mdp.getTransitionStatesAndProbs(state, action):
+                    if probability > 0:
+                        weights = predecessors.setdefault(nextState, {})
+                        weights[state] = max(weights.get(state, 0), probability)
+        return predecessors
+
+    def runValueIteration(self):
+        states = self.mdp.getStates()
+        predecessors = self.computePredecessors(states)
+        budget = self.iterations * len(states)
+        queue = util.PriorityQueue()
+        priorities = {}
+        for state in states:
+            priorities[state] = abs(self.computeBestValue(state) - self.values[state])
+            self.backups += 1
+            if priorities[state] > self.epsilon:
+                queue.push(state, -priorities[state])
+
+        while not queue.isEmpty() and self.backups < budget:
+            state = queue.pop()
+            value = self.computeBestValue(state)
+            self.backups += 1
+            delta = abs(value - self.values[state])
+            self.values[state] = value
+            priorities[state] = 0
+            for predecessor, probability in predecessors[state].items():
+                priorities[predecessor] += self.discount * probability * delta
+                if priorities[predecessor] > self.epsilon:
+                    queue.update(predecessor, -priorities[predecessor])
+
+        self.sweeps = float(self.backups) / max(len(states), 1)
+
+
+class PolicyIterationAgent(MDPValueAgent):
+    """
+        Policy iteration over a CompiledMDP.  Each policy is evaluated
+        exactly by solving (I - discount * P_pi) V = R_pi and then made
+        greedy in those values, until it stops changing or iterations
+        improvements have been made.  This usually takes a handful of
+        iterations even for discounts close to 1.
+
+        self.sweeps counts the improvement steps (one Q value sweep each)
+        and self.evaluations the linear solves.
+    """
+
+    def __init__(self, mdp, discount=0.9, iterations=100):
+        self.evaluations = 0
+        MDPValueAgent.__init__(self, mdp, discount, iterations)
+
+    def runValueIteration(self):
+        self.compiledMdp = compiled = CompiledMDP(self.mdp)
+        rows = compiled.firstRows
+        values = compiled.evaluatePolicy(rows, self.discount)
+        self.evaluations += 1
+        for i in range(0, self.iterations):
+            newRows = compiled.getGreedyRows(compiled.getQValues(values, self.discount), rows)
+            self.sweeps += 1
+            self.backups += compiled.numListedStates
+            if (newRows == rows).all():
+                break
+            rows = newRows
+            # The last policy's values are a close start for an iterative evaluation
+            values = compiled.evaluatePolicy(rows, self.discount, values)
+            self.evaluations += 1
+
+        self.values = self.valuesFromArray(values)
+        self.policy = dict([compiled.rowActions[row] for row in rows])
+
+    def getPolicy(self, state):
+        return self.policy.get(state)
+
+    def getAction(self, state):
+        "Returns the policy at the state (no exploration)."
+        return self.getPolicy(state)
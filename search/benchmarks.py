@@ -0,0 +1,388 @@
+# benchmarks.py
+# -------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Micro-benchmarks for the search project's data structures and algorithms.
+
+  python benchmarks.py                 runs every benchmark
+  python benchmarks.py -b priorityQueue -s 100000
+"""
+
+import heapq
+import random
+import time
+
+import game
+import layout
+import pacman
+import search
+import searchAgents
+import util
+
+
+def timeIt(function, *args):
+    "Returns (result, seconds) for a single call of function(*args)"
+    start = time.time()
+    result = function(*args)
+    return result, time.time() - start
+
+
+class LinearScanPriorityQueue:
+    """
+      The previous util.PriorityQueue.update: a linear scan of the heap
+      followed by a full heapify.  Kept here only as a baseline.
+    """
+    def __init__(self):
+        self.heap = []
+        self.count = 0
+
+    def push(self, item, priority):
+        heapq.heappush(self.heap, (priority, self.count, item))
+        self.count += 1
+
+    def pop(self):
+        (_, _, item) = heapq.heappop(self.heap)
+        return item
+
+    def isEmpty(self):
+        return len(self.heap) == 0
+
+    def update(self, item, priority):
+        for index, (p, c, i) in enumerate(self.heap):
+            if i == item:
+                if p <= priority:
+                    break
+                del self.heap[index]
+                self.heap.append((priority, c, item))
+                heapq.heapify(self.heap)
+                break
+        else:
+            self.push(item, priority)
+
+
+def decreaseKeys(queue, size, updates, seed):
+    "Fills queue with size items, then applies updates decrease-keys"
+    rand = random.Random(seed)
+    for item in xrange(size):
+        queue.update(item, size + rand.random() * size)
+    for _ in xrange(updates):
+        queue.update(rand.randrange(size), rand.random() * size)
+    while not queue.isEmpty():
+        queue.pop()
+
+
+def benchmarkPriorityQueue(options):
+    size = options.size
+    updates = options.updates
+    _, indexed = timeIt(decreaseKeys, util.PriorityQueue(), size, updates, 0)
+    print 'PriorityQueue           frontier=%d updates=%d  %8.3fs  (%.2fus/update)' % \
+          (size, updates, indexed, 1e6 * indexed / (size + updates))
+
+    # The linear baseline is O(n) per update; time a sample and extrapolate
+    sample = min(updates, options.baselineUpdates)
+    baseline = LinearScanPriorityQueue()
+    rand = random.Random(0)
+    for item in xrange(size):
+        baseline.push(item, size + rand.random() * size)
+    start = time.time()
+    for _ in xrange(sample):
+        baseline.update(rand.randrange(size), rand.random() * size)
+    perUpdate = (time.time() - start) / max(sample, 1)
+    print 'LinearScanPriorityQueue frontier=%d updates=%d  %8.3fs  (%.2fus/update, from %d samples)' % \
+          (size, updates, perUpdate * updates, 1e6 * perUpdate, sample)
+    if indexed > 0:
+        print 'Speedup on updates: %.0fx' % (perUpdate * (size + updates) / indexed)
+
+
+class ListQueue:
+    "The previous util.Queue, whose push was list.insert(0, item).  Baseline only."
+    def __init__(self):
+        self.list = []
+
+    def push(self, item):
+        self.list.insert(0, item)
+
+    def pop(self):
+        return self.list.pop()
+
+    def isEmpty(self):
+        return len(self.list) == 0
+
+
+def generateMaze(width, height, wallDensity, seed):
+    """
+    Returns the layout text of a width x height board with a wall border, Pacman
+    in the bottom left and random interior walls at the given density.
+    """
+    rand = random.Random(seed)
+    rows = []
+    for y in range(height):
+        row = []
+        for x in range(width):
+            border = x in (0, width - 1) or y in (0, height - 1)
+            row.append('%' if border or rand.random() < wallDensity else ' ')
+        rows.append(row)
+    rows[height - 2][1] = 'P'
+    rows[height - 2][2] = rows[height - 3][1] = ' '
+    return [''.join(row) for row in rows]
+
+
+def exhaustiveBfs(gameState, queueClass):
+    """
+    Runs search.breadthFirstSearch over every reachable cell with the given
+    queue class standing in for util.Queue.  Returns the number of expansions.
+    """
+    problem = searchAgents.PositionSearchProblem(gameState, goal=(-1, -1), warn=False, visualize=False)
+    originalQueue = util.Queue
+    util.Queue = queueClass
+    try:
+        search.breadthFirstSearch(problem)
+    finally:
+        util.Queue = originalQueue
+    return problem._expanded
+
+
+def benchmarkBreadthFirstSearch(options):
+    boards = [('bigMaze', layout.getLayout('bigMaze'))]
+    for size in (50, 100, 200):
+        boards.append(('generated %dx%d' % (size, size), layout.Layout(generateMaze(size, size, 0.2, 1))))
+    boards.append(('open 200x200', layout.Layout(generateMaze(200, 200, 0.0, 0))))
+    for name, board in boards:
+        gameState = pacman.GameState()
+        gameState.initialize(board, 0)
+        for queueClass in (util.Queue, ListQueue):
+            expanded, seconds = timeIt(exhaustiveBfs, gameState, queueClass)
+            print '%-20s %-10s expanded=%6d  %7.3fs  (%.2fus/node)' % \
+                  (name, queueClass.__name__, expanded, seconds, 1e6 * seconds / max(expanded, 1))
+
+    # On a 2D board the BFS frontier is bounded by the board's perimeter, so
+    # the quadratic term only shows once the queue itself holds many items.
+    for size in (10000, 50000, 100000):
+        for queueClass in (util.Queue, ListQueue):
+            _, seconds = timeIt(fillAndDrain, queueClass(), size)
+            print 'fill/drain %-9d %-10s %7.3fs  (%.2fus/item)' % \
+                  (size, queueClass.__name__, seconds, 1e6 * seconds / size)
+
+
+def fillAndDrain(queue, size):
+    for item in xrange(size):
+        queue.push(item)
+    while not queue.isEmpty():
+        queue.pop()
+
+
+def legacyStateHash(data):
+    "The previous GameStateData.__hash__, which rehashes every agent and the whole food grid"
+    for i, state in enumerate( data.agentStates ):
+        int(hash(state))
+    foodHash, base = 0, 1
+    for column in data.food.data:
+        for cell in column:
+            if cell:
+                foodHash += base
+            base *= 2
+    return int((hash(tuple(data.agentStates)) + 13*hash(foodHash) + 113* hash(tuple(data.capsules)) + 7 * hash(data.score)) % 1048575 )
+
+
+class LegacyHashedState:
+    "Wraps a GameState so that dictionaries use legacyStateHash"
+    __slots__ = ('state',)
+
+    def __init__(self, state):
+        self.state = state
+
+    def __eq__(self, other):
+        return self.state == other.state
+
+    def __hash__(self):
+        return legacyStateHash(self.state.data)
+
+
+def expandGameTree(board, depth):
+    "Returns every state reachable in depth plies (all agents move) from the start of board"
+    start = pacman.GameState()
+    start.initialize(board, board.getNumGhosts())
+    states, frontier = [start], [start]
+    for ply in range(depth):
+        agentIndex = ply % start.getNumAgents()
+        successors = []
+        for state in frontier:
+            if state.isWin() or state.isLose(): continue
+            for action in state.getLegalActions(agentIndex):
+                successors.append(state.generateSuccessor(agentIndex, action))
+        states.extend(successors)
+        frontier = successors
+    return states
+
+
+def transpositionLookups(keys, rounds):
+    "Inserts every key into a table, then looks every key up rounds times"
+    table = {}
+    for key in keys:
+        table[key] = table.get(key, 0) + 1
+    hits = 0
+    for _ in range(rounds):
+        for key in keys:
+            if key in table:
+                hits += 1
+    return hits
+
+
+def benchmarkStateHashing(options):
+    for name, depth in (('mediumClassic', 12), ('originalClassic', 10)):
+        states = expandGameTree(layout.getLayout(name), depth)
+        for label, keys in (('zobrist', states), ('legacy', [LegacyHashedState(s) for s in states])):
+            hits, seconds = timeIt(transpositionLookups, keys, 5)
+            print '%-16s %-8s states=%6d lookups=%7d  %7.3fs  (%.2fus/lookup)' % \
+                  (name, label, len(states), hits, seconds, 1e6 * seconds / (hits + len(keys)))
+
+
+def randomPlayout(board, seed):
+    """
+    Plays random legal moves for every agent on board.  Returns a list of
+    (state, agentIndex, legalActions) for every non-terminal state visited.
+    """
+    rand = random.Random(seed)
+    state = pacman.GameState()
+    state.initialize(board, board.getNumGhosts())
+    turns = []
+    while not (state.isWin() or state.isLose()):
+        agentIndex = len(turns) % state.getNumAgents()
+        actions = state.getLegalActions(agentIndex)
+        turns.append((state, agentIndex, actions))
+        state = state.generateSuccessor(agentIndex, rand.choice(actions))
+    return turns
+
+
+def benchmarkSuccessors(options):
+    for name in ('mediumClassic', 'originalClassic'):
+        board = layout.getLayout(name)
+        turns = []
+        for seed in range(5):
+            turns.extend(randomPlayout(board, seed))
+        states = [state for state, _, _ in turns]
+
+        start = time.time()
+        successors = []
+        for state, agentIndex, actions in turns:
+            for action in actions:
+                successors.append(state.generateSuccessor(agentIndex, action))
+        seconds = time.time() - start
+
+        numAgents = states[0].getNumAgents()
+        copiedAgents = sum([numAgents - len(s.data._sharedAgents) for s in successors])
+        copiedFood = len([s for s in successors if not s.data._sharedFood])
+        copiedCapsules = len([s for s in successors if not s.data._sharedCapsules])
+        print '%-16s successors=%6d  %.2fus/successor' % (name, len(successors), 1e6 * seconds / len(successors))
+        print '%-16s copied per successor: %.2f of %d agent states, %.3f food grids, %.3f capsule lists' % \
+              (name, float(copiedAgents) / len(successors), numAgents,
+               float(copiedFood) / len(successors), float(copiedCapsules) / len(successors))
+
+        for label, observe in (('deepCopy', pacman.GameState.deepCopy), ('getObservation', pacman.GameState.getObservation)):
+            _, seconds = timeIt(lambda: [observe(s) for s in states])
+            print '%-16s %-15s %.2fus/observation' % (name, label, 1e6 * seconds / len(states))
+
+
+def legacyPossibleActions(config, walls):
+    "The previous Actions.getPossibleActions, which reads the walls on every call"
+    x, y = config.pos
+    x_int, y_int = int(x + 0.5), int(y + 0.5)
+    if (abs(x - x_int) + abs(y - y_int)  > game.Actions.TOLERANCE):
+        return [config.getDirection()]
+    possible = []
+    for dir, (dx, dy) in game.Actions._directionsAsList:
+        if not walls[x_int + dx][y_int + dy]: possible.append(dir)
+    return possible
+
+
+def legacyLegalNeighbors(position, walls):
+    "The previous Actions.getLegalNeighbors"
+    x, y = position
+    x_int, y_int = int(x + 0.5), int(y + 0.5)
+    neighbors = []
+    for dir, (dx, dy) in game.Actions._directionsAsList:
+        next_x, next_y = x_int + dx, y_int + dy
+        if next_x < 0 or next_x == walls.width: continue
+        if next_y < 0 or next_y == walls.height: continue
+        if not walls[next_x][next_y]: neighbors.append((next_x, next_y))
+    return neighbors
+
+
+def playLegalMoves(turns):
+    "Asks every recorded state for its legal actions and expands one successor"
+    for state, agentIndex, actions in turns:
+        state.generateSuccessor(agentIndex, state.getLegalActions(agentIndex)[0])
+
+
+def queryNeighbors(positions, walls, rounds):
+    for _ in range(rounds):
+        for position in positions:
+            game.Actions.getLegalNeighbors(position, walls)
+
+
+def benchmarkLegalMoves(options):
+    implementations = [('table', game.Actions.getPossibleActions, game.Actions.getLegalNeighbors),
+                       ('legacy', legacyPossibleActions, legacyLegalNeighbors)]
+    for name in ('mediumClassic', 'originalClassic'):
+        board = layout.getLayout(name)
+        board.getMoveTable()
+        turns = []
+        for seed in range(5):
+            turns.extend(randomPlayout(board, seed))
+        positions = board.walls.asList(False)
+        for label, possibleActions, legalNeighbors in implementations:
+            original = (game.Actions.getPossibleActions, game.Actions.getLegalNeighbors)
+            game.Actions.getPossibleActions = staticmethod(possibleActions)
+            game.Actions.getLegalNeighbors = staticmethod(legalNeighbors)
+            try:
+                _, playSeconds = timeIt(playLegalMoves, turns)
+                _, neighborSeconds = timeIt(queryNeighbors, positions, board.walls, 20)
+            finally:
+                game.Actions.getPossibleActions = staticmethod(original[0])
+                game.Actions.getLegalNeighbors = staticmethod(original[1])
+            print '%-16s %-7s %.2fus/legal move + successor  %.2fus/getLegalNeighbors' % \
+                  (name, label, 1e6 * playSeconds / len(turns), 1e6 * neighborSeconds / (20 * len(positions)))
+
+
+BENCHMARKS = [
+    ('priorityQueue', benchmarkPriorityQueue),
+    ('bfs', benchmarkBreadthFirstSearch),
+    ('stateHash', benchmarkStateHashing),
+    ('successors', benchmarkSuccessors),
+    ('legalMoves', benchmarkLegalMoves),
+]
+
+
+def readCommand(argv):
+    from optparse import OptionParser
+    parser = OptionParser('USAGE: python benchmarks.py [options]')
+    parser.add_option('-b', '--benchmark', dest='benchmark', default=None,
+                      help='only run the named benchmark (%s)' % ', '.join([n for n, _ in BENCHMARKS]))
+    parser.add_option('-s', '--size', dest='size', type='int', default=100000,
+                      help='frontier size for the priority queue benchmark')
+    parser.add_option('-u', '--updates', dest='updates', type='int', default=100000,
+                      help='number of decrease-key operations')
+    parser.add_option('--baselineUpdates', dest='baselineUpdates', type='int', default=200,
+                      help='number of updates to time on the linear-scan baseline')
+    options, _ = parser.parse_args(argv)
+    return options
+
+
+if __name__ == '__main__':
+    import sys
+    options = readCommand(sys.argv[1:])
+    for name, benchmark in BENCHMARKS:
+        if options.benchmark is None or options.benchmark == name:
+            print '*** %s' % name
+            benchmark(options)
@@ -21,7 +21,7 @@
 # For more info, see http://inst.eecs.berkeley.edu/~cs188/sp09/pacman.html
 
 from util import *
-import time, os
+import time, os, random
 import traceback
 import sys
 
@@ -161,9 +161,13 @@ class AgentState:
 
 class Grid:
     """
-    A 2-dimensional array of objects backed by a list of lists.  Data is accessed
-    via grid[x][y] where (x,y) are positions on a Pacman map with x horizontal,
-    y vertical and the origin (0,0) in the bottom left corner.
+    A 2-dimensional array of booleans backed by one bytearray per column.  Data
+    is accessed via grid[x][y] where (x,y) are positions on a Pacman map with x
+    horizontal, y vertical and the origin (0,0) in the bottom left corner.
+    Cells read back as 1 or 0, which compare equal to True and False.
+
+    The grid keeps a running count of True cells and caches its hash until the
+    next write, so count() is O(1) and hashing an unchanged grid is free.
 
     The __str__ method constructs an output that is oriented like a pacman board.
     """
@@ -173,7 +177,10 @@ class Grid:
 
         self.width = width
         self.height = height
-        self.data = [[initialValue for y in range(height)] for x in range(width)]
+        self.data = [_GridColumn(self, (initialValue and '\x01' or '\x00') * height) for x in range(width)]
+        self.numTrue = initialValue and width * height or 0
+        self.cachedHash = None
+        self.moveTable = None # see Actions.getMoveTable
         if bitRepresentation:
             self._unpackBits(bitRepresentation)
 
@@ -181,10 +188,11 @@ class Grid:
         return self.data[i]
 
     def __setitem__(self, key, item):
-        self.data[key] = item
+        self.data[key] = _GridColumn(self, [cell and 1 or 0 for cell in item])
+        self._recount()
 
     def __str__(self):
-        out = [[str(self.data[x][y])[0] for x in range(self.width)] for y in range(self.height)]
+        out = [[self.data[x][y] and 'T' or 'F' for x in range(self.width)] for y in range(self.height)]
         out.reverse()
         return '\n'.join([''.join(x) for x in out])
 
@@ -193,37 +201,62 @@ class Grid:
         return self.data == other.data
 
     def __hash__(self):
-        # return hash(str(self))
-        base = 1
-        h = 0
-        for l in self.data:
-            for i in l:
-                if i:
-                    h += base
-                base *= 2
-        return hash(h)
+        # Same value as hashing the int with bit x * height + y set for each True cell
+        if self.cachedHash is None:
+            cells = str(bytearray().join(self.data)).translate(_BIT_CHARACTERS)
+            self.cachedHash = hash(cells and int(cells[::-1], 2) or 0)
+        return self.cachedHash
+
+    def __getstate__(self):
+        # Pickle as lists of booleans, the format used by older versions of Grid
+        state = self.__dict__.copy()
+        state['data'] = [[cell == 1 for cell in column] for column in self.data]
+        del state['numTrue'], state['cachedHash']
+        state.pop('moveTable', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.data = [_GridColumn(self, [cell and 1 or 0 for cell in column]) for column in state['data']]
+        self._recount()
+
+    def _recount(self):
+        self.numTrue = sum([column.count('\x01') for column in self.data])
+        self.cachedHash = None
+        self.moveTable = None
+
+    def _changed(self, delta):
+        self.numTrue += delta
+        self.cachedHash = None
+        self.moveTable = None
 
     def copy(self):
         g = Grid(self.width, self.height)
-        g.data = [x[:] for x in self.data]
+        g.data = [_GridColumn(g, column) for column in self.data]
+        g.numTrue = self.numTrue
+        g.cachedHash = self.cachedHash
+        g.moveTable = self.moveTable
         return g
 
     def deepCopy(self):
         return self.copy()
 
     def shallowCopy(self):
-        g = Grid(self.width, self.height)
-        g.data = self.data
-        return g
+        # A shallow copy shares every cell and therefore the count and hash too
+        return self
 
     def count(self, item =True ):
-        return sum([x.count(item) for x in self.data])
+        if item:
+            return self.numTrue
+        return self.width * self.height - self.numTrue
 
     def asList(self, key = True):
+        key = key and 1 or 0
         list = []
         for x in range(self.width):
+            column = self.data[x]
             for y in range(self.height):
-                if self[x][y] == key: list.append( (x,y) )
+                if column[y] == key: list.append( (x,y) )
         return list
 
     def packBits(self):
@@ -233,16 +266,12 @@ class Grid:
         (width, height, bitPackedInts...)
         """
         bits = [self.width, self.height]
-        currentInt = 0
-        for i in range(self.height * self.width):
-            bit = self.CELLS_PER_INT - (i % self.CELLS_PER_INT) - 1
-            x, y = self._cellIndexToPosition(i)
-            if self[x][y]:
-                currentInt += 2 ** bit
-            if (i + 1) % self.CELLS_PER_INT == 0:
-                bits.append(currentInt)
-                currentInt = 0
-        bits.append(currentInt)
+        cells = str(bytearray().join(self.data)).translate(_BIT_CHARACTERS)
+        for start in range(0, len(cells), self.CELLS_PER_INT):
+            chunk = cells[start:start + self.CELLS_PER_INT]
+            bits.append(int(chunk, 2) << (self.CELLS_PER_INT - len(chunk)))
+        if len(cells) % self.CELLS_PER_INT == 0:
+            bits.append(0)
         return tuple(bits)
 
     def _cellIndexToPosition(self, index):
@@ -274,6 +303,30 @@ class Grid:
                 bools.append(False)
         return bools
 
+_BIT_CHARACTERS = '01' + ''.join([chr(i) for i in range(2, 256)])
+
+class _GridColumn(bytearray):
+    """
+    One column of a Grid.  Reads are plain bytearray indexing; writes keep the
+    owning grid's count and hash up to date.
+    """
+    __slots__ = ('grid',)
+
+    def __init__(self, grid, cells):
+        bytearray.__init__(self, cells)
+        self.grid = grid
+
+    def __setitem__(self, y, value):
+        if isinstance(y, slice):
+            bytearray.__setitem__(self, y, bytearray([cell and 1 or 0 for cell in value]))
+            self.grid._recount()
+            return
+        value = value and 1 or 0
+        delta = value - bytearray.__getitem__(self, y)
+        if delta:
+            bytearray.__setitem__(self, y, value)
+            self.grid._changed(delta)
+
 def reconstituteGrid(bitRep):
     if type(bitRep) is not type((1,2)):
         return bitRep
@@ -330,7 +383,6 @@ class Actions:
     directionToVector = staticmethod(directionToVector)
 
     def getPossibleActions(config, walls):
-        possible = []
         x, y = config.pos
         x_int, y_int = int(x + 0.5), int(y + 0.5)
 
@@ -338,51 +390,123 @@ class Actions:
         if (abs(x - x_int) + abs(y - y_int)  > Actions.TOLERANCE):
             return [config.getDirection()]
 
-        for dir, vec in Actions._directionsAsList:
-            dx, dy = vec
-            next_y = y_int + dy
-            next_x = x_int + dx
-            if not walls[next_x][next_y]: possible.append(dir)
-
-        return possible
+        moves = Actions.getMoveTable(walls).possibleActions[x_int * walls.height + y_int]
+        if moves is None:
+            # The table could not be built for this cell; look at the walls directly
+            return [dir for dir, (dx, dy) in Actions._directionsAsList if not walls[x_int + dx][y_int + dy]]
+        return moves[:]
 
     getPossibleActions = staticmethod(getPossibleActions)
 
     def getLegalNeighbors(position, walls):
         x,y = position
         x_int, y_int = int(x + 0.5), int(y + 0.5)
-        neighbors = []
-        for dir, vec in Actions._directionsAsList:
-            dx, dy = vec
-            next_x = x_int + dx
-            if next_x < 0 or next_x == walls.width: continue
-            next_y = y_int + dy
-            if next_y < 0 or next_y == walls.height: continue
-            if not walls[next_x][next_y]: neighbors.append((next_x, next_y))
-        return neighbors
+        return Actions.getMoveTable(walls).legalNeighbors[x_int * walls.height + y_int][:]
     getLegalNeighbors = staticmethod(getLegalNeighbors)
 
+    def getMoveTable(walls):
+        """
+        Returns the MoveTable for a wall grid.  It is built on first use and kept
+        on the grid until the walls change, so every state of a layout shares it.
+        """
+        if walls.moveTable is None:
+            walls.moveTable = MoveTable(walls)
+        return walls.moveTable
+    getMoveTable = staticmethod(getMoveTable)
+
     def getSuccessor(position, action):
         dx, dy = Actions.directionToVector(action)
         x, y = position
         return (x + dx, y + dy)
     getSuccessor = staticmethod(getSuccessor)
 
-class GameStateData:
+class MoveTable:
+    """
+    The legal directions and neighbouring cells of every grid point of a wall
+    grid, indexed by x * height + y, in the order Actions has always produced
+    them.  Cells whose moves would index past the grid get None and are
+    checked against the walls directly.
+    """
+    def __init__(self, walls):
+        self.possibleActions = []
+        self.legalNeighbors = []
+        for x in range(walls.width):
+            for y in range(walls.height):
+                try:
+                    possible = [dir for dir, (dx, dy) in Actions._directionsAsList if not walls[x + dx][y + dy]]
+                except IndexError:
+                    possible = None
+                self.possibleActions.append(possible)
+                neighbors = []
+                for dir, (dx, dy) in Actions._directionsAsList:
+                    next_x, next_y = x + dx, y + dy
+                    if next_x < 0 or next_x == walls.width: continue
+                    if next_y < 0 or next_y == walls.height: continue
+                    if not walls[next_x][next_y]: neighbors.append((next_x, next_y))
+                self.legalNeighbors.append(neighbors)
+
+class ZobristKeys:
+    """
+    Random 64-bit keys for Zobrist hashing of game states on one board.  A
+    state's hash is the XOR of the keys of its food, its capsules and its
+    agents' configurations, so each change to the state updates it in O(1).
+
+    Agent keys are kept at half-cell resolution because scared ghosts move at
+    half speed.
     """
+    SEED = 188
+
+    def __init__(self, width, height, numAgents):
+        rand = random.Random(ZobristKeys.SEED)
+        self.height = height
+        self.food = [rand.getrandbits(64) for i in range(width * height)]
+        self.capsules = [rand.getrandbits(64) for i in range(width * height)]
+        self.agentHeight = 2 * height + 1
+        agentCells = (2 * width + 1) * self.agentHeight
+        self.agents = [[rand.getrandbits(64) for i in range(agentCells)] for agent in range(numAgents)]
+        self.directions = [dict([(direction, rand.getrandbits(64)) for direction in sorted(Actions._directions)])
+                           for agent in range(numAgents)]
+
+    def foodKey(self, position):
+        x, y = position
+        return self.food[x * self.height + y]
+
+    def capsuleKey(self, position):
+        x, y = position
+        return self.capsules[x * self.height + y]
 
+    def agentKey(self, agentIndex, configuration):
+        x, y = configuration.pos
+        return self.agents[agentIndex][int(2 * x + 0.5) * self.agentHeight + int(2 * y + 0.5)] ^ \
+            self.directions[agentIndex][configuration.direction]
+
+class GameStateData:
     """
+    A successor shares its food grid, capsule list and agent states with its
+    predecessor.  Code that changes a state must go through getMutableFood,
+    getMutableCapsules and getMutableAgentState, which copy a component the
+    first time it is written (copy-on-write).
+    """
+    # Defaults for states created by deepCopy or initialize, which own everything
+    _sharedAgents = frozenset()
+    _sharedFood = False
+    _sharedCapsules = False
+
     def __init__( self, prevState = None ):
         """
         Generates a new data packet by copying information from its predecessor.
         """
         if prevState != None:
-            self.food = prevState.food.shallowCopy()
-            self.capsules = prevState.capsules[:]
-            self.agentStates = self.copyAgentStates( prevState.agentStates )
+            self.food = prevState.food
+            self.capsules = prevState.capsules
+            self.agentStates = prevState.agentStates[:]
+            self._sharedFood = True
+            self._sharedCapsules = True
+            self._sharedAgents = set(range(len(self.agentStates)))
             self.layout = prevState.layout
             self._eaten = prevState._eaten
             self.score = prevState.score
+            self.zobristHash = prevState.getZobristHash()
 
         self._foodEaten = None
         self._foodAdded = None
@@ -395,6 +519,10 @@ class GameStateData:
     def deepCopy( self ):
         state = GameStateData( self )
         state.food = self.food.deepCopy()
+        state.capsules = self.capsules[:]
+        state.agentStates = self.copyAgentStates( self.agentStates )
+        state._sharedFood = state._sharedCapsules = False
+        state._sharedAgents = frozenset()
         state.layout = self.layout.deepCopy()
         state._agentMoved = self._agentMoved
         state._foodEaten = self._foodEaten
@@ -408,6 +536,27 @@ class GameStateData:
             copiedStates.append( agentState.copy() )
         return copiedStates
 
+    def getMutableFood( self ):
+        "Returns the food grid, copying it first if it is shared with the predecessor"
+        if self._sharedFood:
+            self.food = self.food.copy()
+            self._sharedFood = False
+        return self.food
+
+    def getMutableCapsules( self ):
+        "Returns the capsule list, copying it first if it is shared with the predecessor"
+        if self._sharedCapsules:
+            self.capsules = self.capsules[:]
+            self._sharedCapsules = False
+        return self.capsules
+
+    def getMutableAgentState( self, agentIndex ):
+        "Returns the agent's state, copying it first if it is shared with the predecessor"
+        if agentIndex in self._sharedAgents:
+            self.agentStates[agentIndex] = self.agentStates[agentIndex].copy()
+            self._sharedAgents.remove(agentIndex)
+        return self.agentStates[agentIndex]
+
     def __eq__( self, other ):
         """
         Allows two states to be compared.
@@ -424,17 +573,48 @@ class GameStateData:
         """
         Allows states to be keys of dictionaries.
         """
-        for i, state in enumerate( self.agentStates ):
-            try:
-                int(hash(state))
-            except TypeError, e:
-                print e
-                #hash(state)
-        return int((hash(tuple(self.agentStates)) + 13*hash(self.food) + 113* hash(tuple(self.capsules)) + 7 * hash(self.score)) % 1048575 )
+        return hash((self.getZobristHash(), self.score))
+
+    def getZobristHash( self ):
+        """
+        Returns the Zobrist hash of the food, capsules and agent configurations.  The
+        game rules keep it up to date through the update*Hash methods below.
+        """
+        if not hasattr(self, 'zobristHash'):
+            # States pickled before the hash existed
+            self.zobristHash = self.computeZobristHash()
+        return self.zobristHash
+
+    def computeZobristHash( self ):
+        keys = self.layout.getZobristKeys()
+        h = 0
+        for position in self.food.asList():
+            h ^= keys.foodKey(position)
+        for position in self.capsules:
+            h ^= keys.capsuleKey(position)
+        for agentIndex, agentState in enumerate(self.agentStates):
+            if agentState.configuration != None:
+                h ^= keys.agentKey(agentIndex, agentState.configuration)
+        return h
+
+    def updateFoodHash( self, position ):
+        "Call when the food at position is added or removed"
+        self.zobristHash = self.getZobristHash() ^ self.layout.getZobristKeys().foodKey(position)
+
+    def updateCapsuleHash( self, position ):
+        "Call when the capsule at position is added or removed"
+        self.zobristHash = self.getZobristHash() ^ self.layout.getZobristKeys().capsuleKey(position)
+
+    def updateAgentHash( self, agentIndex, oldConfiguration, newConfiguration ):
+        "Call when an agent's configuration is replaced"
+        keys = self.layout.getZobristKeys()
+        self.zobristHash = self.getZobristHash() ^ keys.agentKey(agentIndex, oldConfiguration) ^ \
+            keys.agentKey(agentIndex, newConfiguration)
 
     def __str__( self ):
         width, height = self.layout.width, self.layout.height
-        map = Grid(width, height)
+        # Grids only hold booleans, so the characters go in a plain list of lists
+        map = [[None] * height for x in range(width)]
         if type(self.food) == type((1,2)):
             self.food = reconstituteGrid(self.food)
         for x in range(width):
@@ -455,7 +635,9 @@ class GameStateData:
         for x, y in self.capsules:
             map[x][y] = 'o'
 
-        return str(map) + ("\nScore: %d\n" % self.score)
+        out = [[map[x][y] for x in range(width)] for y in range(height)]
+        out.reverse()
+        return '\n'.join([''.join(x) for x in out]) + ("\nScore: %d\n" % self.score)
 
     def _foodWallStr( self, hasFood, hasWall ):
         if hasFood:
@@ -503,6 +685,7 @@ class GameStateData:
                 else: numGhosts += 1
             self.agentStates.append( AgentState( Configuration( pos, Directions.STOP), isPacman) )
         self._eaten = [False for a in self.agentStates]
+        self.zobristHash = self.computeZobristHash()
 
 try:
     import boinc
@@ -624,7 +807,7 @@ class Game:
                         timed_func = TimeoutFunction(agent.observationFunction, int(self.rules.getMoveTimeout(agentIndex)))
                         try:
                             start_time = time.time()
-                            observation = timed_func(self.state.deepCopy())
+                            observation = timed_func(self.state.getObservation())
                         except TimeoutFunctionException:
                             skip_action = True
                         move_time += time.time() - start_time
@@ -634,10 +817,10 @@ class Game:
                         self.unmute()
                         return
                 else:
-                    observation = agent.observationFunction(self.state.deepCopy())
+                    observation = agent.observationFunction(self.state.getObservation())
                 self.unmute()
             else:
-                observation = self.state.deepCopy()
+                observation = self.state.getObservation()
 
             # Solicit an action
             action = None
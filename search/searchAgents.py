@@ -40,6 +40,11 @@ from game import Actions
 import util
 import time
 import search
+import array
+import collections
+import hashlib
+import os
+import weakref
 
 class GoWestAgent(Agent):
     "An agent that goes West until it can't."
@@ -418,11 +423,118 @@ class FoodSearchProblem:
             cost += 1
         return cost
 
+class FoodBitmask:
+    """
+    An immutable set of remaining food stored as an int bitmask over the food
+    positions of the starting state.  Removing a dot, hashing and count() are
+    O(1), and it supports the read-only parts of the Grid interface
+    (food[x][y], count() and asList()) so food heuristics keep working.
+    """
+    __slots__ = ('bits', 'numFood', 'positions', 'bitIndex', 'width', 'height')
+
+    def __init__(self, bits, numFood, positions, bitIndex, width, height):
+        self.bits = bits
+        self.numFood = numFood
+        self.positions = positions # shared by every mask derived from the same grid
+        self.bitIndex = bitIndex
+        self.width = width
+        self.height = height
+
+    def fromGrid(grid):
+        "Builds a FoodBitmask with one bit per True cell of grid"
+        positions = tuple(grid.asList())
+        bitIndex = dict((position, i) for i, position in enumerate(positions))
+        return FoodBitmask((1 << len(positions)) - 1, len(positions), positions, bitIndex, grid.width, grid.height)
+    fromGrid = staticmethod(fromGrid)
+
+    def hasFood(self, position):
+        i = self.bitIndex.get(position)
+        return i is not None and (self.bits >> i) & 1 == 1
+
+    def without(self, position):
+        "Returns the mask with the food at position eaten (self if there is none)"
+        i = self.bitIndex.get(position)
+        if i is None or not (self.bits >> i) & 1:
+            return self
+        return FoodBitmask(self.bits & ~(1 << i), self.numFood - 1, self.positions, self.bitIndex, self.width, self.height)
+
+    def count(self, item=True):
+        if item:
+            return self.numFood
+        return self.width * self.height - self.numFood
+
+    def asList(self, key=True):
+        if not key:
+            return [(x, y) for x in range(self.width) for y in range(self.height) if not self.hasFood((x, y))]
+        bits = self.bits
+        return [position for i, position in enumerate(self.positions) if (bits >> i) & 1]
+
+    def copy(self):
+        return self
+
+    def __getitem__(self, x):
+        return _FoodBitmaskColumn(self, x)
+
+    def __eq__(self, other):
+        if not isinstance(other, FoodBitmask): return False
+        return self.bits == other.bits and self.positions is other.positions
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def __str__(self):
+        out = [[self.hasFood((x, y)) and 'T' or 'F' for x in range(self.width)] for y in range(self.height)]
+        out.reverse()
+        return '\n'.join([''.join(x) for x in out])
+
+class _FoodBitmaskColumn:
+    "Supports food[x][y] lookups on a FoodBitmask"
+    __slots__ = ('food', 'x')
+
+    def __init__(self, food, x):
+        self.food = food
+        self.x = x
+
+    def __getitem__(self, y):
+        return self.food.hasFood((self.x, y))
+
+class BitmaskFoodSearchProblem(FoodSearchProblem):
+    """
+    The FoodSearchProblem with the food stored as a FoodBitmask instead of a
+    Grid, so successors don't copy the grid and closed-set lookups hash an int.
+
+    A search state in this problem is a tuple ( pacmanPosition, foodBitmask ).
+    """
+    def __init__(self, startingGameState):
+        FoodSearchProblem.__init__(self, startingGameState)
+        self.start = (startingGameState.getPacmanPosition(), FoodBitmask.fromGrid(startingGameState.getFood()))
+
+    def getSuccessors(self, state):
+        "Returns successor states, the actions they require, and a cost of 1."
+        successors = []
+        self._expanded += 1 # DO NOT CHANGE
+        x,y = state[0]
+        for direction in [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST]:
+            dx, dy = Actions.directionToVector(direction)
+            nextx, nexty = int(x + dx), int(y + dy)
+            if not self.walls[nextx][nexty]:
+                successors.append( ( ((nextx, nexty), state[1].without((nextx, nexty))), direction, 1) )
+        return successors
+
 class AStarFoodSearchAgent(SearchAgent):
-    "A SearchAgent for FoodSearchProblem using A* and your foodHeuristic"
-    def __init__(self):
+    """
+    A SearchAgent for FoodSearchProblem using A* and your foodHeuristic
+
+    Use -a prob=BitmaskFoodSearchProblem for the compact food representation.
+    """
+    def __init__(self, prob='FoodSearchProblem'):
+        if prob not in ('FoodSearchProblem', 'BitmaskFoodSearchProblem'):
+            raise AttributeError, prob + ' is not a food search problem type in SearchAgents.py.'
         self.searchFunction = lambda prob: search.aStarSearch(prob, foodHeuristic)
-        self.searchType = FoodSearchProblem
+        self.searchType = globals()[prob]
 
 def foodHeuristic(state, problem):
     """
@@ -525,9 +637,11 @@ class AnyFoodSearchProblem(PositionSearchProblem):
 
 def mazeDistance(point1, point2, gameState):
     """
-    Returns the maze distance between any two points, using the search functions
-    you have already built. The gameState can be any game state -- Pacman's
-    position in that state is ignored.
+    Returns the maze distance between any two points. The gameState can be any
+    game state -- Pacman's position in that state is ignored.
+
+    Distances come from the MazeDistances oracle for the state's walls, so
+    after the first call on a layout each lookup is O(1).
 
     Example usage: mazeDistance( (2,4), (5,6), gameState)
 
@@ -538,5 +652,150 @@ def mazeDistance(point1, point2, gameState):
     walls = gameState.getWalls()
     assert not walls[x1][y1], 'point1 is a wall: ' + str(point1)
     assert not walls[x2][y2], 'point2 is a wall: ' + str(point2)
-    prob = PositionSearchProblem(gameState, start=point1, goal=point2, warn=False, visualize=False)
-    return len(search.bfs(prob))
+    distance = getMazeDistances(walls).getDistance(point1, point2)
+    assert distance is not None, 'no path from %s to %s' % (point1, point2)
+    return distance
+
+class MazeDistances:
+    """
+    All-pairs shortest path lengths between the open cells of a wall grid.
+
+    One breadth first search is run from every open cell and the results are
+    stored as a flat uint16 matrix, row-major by source cell.  The matrix is
+    written to CACHE_DIRECTORY under a hash of the walls, so later runs on the
+    same layout only read it back.
+
+    The matrix grows with the square of the number of cells, so grids with
+    more than TABLE_CELL_LIMIT open cells get no matrix: the row of a source
+    cell is searched for when it is first asked for, and the last
+    ROW_CACHE_SIZE rows are kept.
+    """
+    UNREACHABLE = 0xFFFF
+    TABLE_CELL_LIMIT = 2048
+    ROW_CACHE_SIZE = 256
+    CACHE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mazeDistanceCache')
+
+    def __init__(self, walls, useCache=True):
+        self.width = walls.width
+        self.height = walls.height
+        self.cells = walls.asList(False)
+        self.cellIndex = dict((cell, i) for i, cell in enumerate(self.cells))
+        self.neighbors = []
+        for x, y in self.cells:
+            adjacent = [(x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)]
+            self.neighbors.append([self.cellIndex[cell] for cell in adjacent if cell in self.cellIndex])
+        self.key = MazeDistances.getKey(walls)
+        self.distances = None
+        if len(self.cells) > MazeDistances.TABLE_CELL_LIMIT:
+            self.rows = {}
+            self.rowOrder = collections.deque()
+            return
+        if useCache:
+            self.distances = self._readCache()
+        if self.distances is None:
+            self.distances = self._computeDistances()
+            if useCache:
+                self._writeCache()
+
+    def getKey(walls):
+        "Returns the hash of a wall grid's packed bits that names its oracle"
+        return hashlib.sha1(repr(walls.packBits())).hexdigest()
+    getKey = staticmethod(getKey)
+
+    def getDistance(self, point1, point2):
+        "Returns the maze distance between two open cells, or None if there is no path"
+        if self.distances is None:
+            distance = self._getRow(self.cellIndex[point1])[self.cellIndex[point2]]
+        else:
+            distance = self.distances[self.cellIndex[point1] * len(self.cells) + self.cellIndex[point2]]
+        if distance == MazeDistances.UNREACHABLE:
+            return None
+        return distance
+
+    def _search(self, source, distances, row):
+        "Fills distances[row:row + n] with the distances from cell number source"
+        neighbors = self.neighbors
+        distances[row + source] = 0
+        fringe = collections.deque([source])
+        while fringe:
+            current = fringe.popleft()
+            nextDistance = distances[row + current] + 1
+            for neighbor in neighbors[current]:
+                if distances[row + neighbor] == MazeDistances.UNREACHABLE:
+                    distances[row + neighbor] = nextDistance
+                    fringe.append(neighbor)
+
+    def _computeDistances(self):
+        n = len(self.cells)
+        distances = array.array('H', [MazeDistances.UNREACHABLE]) * (n * n)
+        for source in xrange(n):
+            self._search(source, distances, source * n)
+        return distances
+
+    def _getRow(self, source):
+        "Returns the distances from cell number source, searching for them if they aren't kept"
+        row = self.rows.get(source)
+        if row is None:
+            row = array.array('H', [MazeDistances.UNREACHABLE]) * len(self.cells)
+            self._search(source, row, 0)
+            if len(self.rowOrder) >= MazeDistances.ROW_CACHE_SIZE:
+                del self.rows[self.rowOrder.popleft()]
+            self.rows[source] = row
+            self.rowOrder.append(source)
+        return row
+
+    def _cacheFile(self):
+        return os.path.join(MazeDistances.CACHE_DIRECTORY, self.key + '.dist')
+
+    def _readCache(self):
+        fileName = self._cacheFile()
+        if not os.path.exists(fileName):
+            return None
+        n = len(self.cells)
+        distances = array.array('H')
+        f = open(fileName, 'rb')
+        try:
+            distances.fromfile(f, n * n)
+        except EOFError:
+            return None
+        finally:
+            f.close()
+        return distances
+
+    def _writeCache(self):
+        try:
+            if not os.path.isdir(MazeDistances.CACHE_DIRECTORY):
+                os.makedirs(MazeDistances.CACHE_DIRECTORY)
+            # Write to a temporary name first so readers never see a partial file
+            fileName = self._cacheFile()
+            temporary = '%s.%d.tmp' % (fileName, os.getpid())
+            f = open(temporary, 'wb')
+            try:
+                self.distances.tofile(f)
+            finally:
+                f.close()
+            os.rename(temporary, fileName)
+        except (IOError, OSError):
+            # The cache is only an optimization
+            pass
+
+# The oracles by MazeDistances key, so wall grids with the same walls share one
+_mazeDistancesCache = {}
+# The key of each wall grid seen so far, without keeping the grids alive
+_mazeDistancesKeys = weakref.WeakKeyDictionary()
+
+def getMazeDistances(walls):
+    """
+    Returns the MazeDistances oracle for a wall grid, building it at most once
+    per set of walls.  Game states copy their walls, so the copies are looked up
+    by value; a grid equal to one seen before skips hashing its packed bits.
+    """
+    key = _mazeDistancesKeys.get(walls)
+    if key is None:
+        key = MazeDistances.getKey(walls)
+        _mazeDistancesKeys[walls] = key
+    distances = _mazeDistancesCache.get(key)
+    if distances is None:
+        distances = MazeDistances(walls)
+        _mazeDistancesCache[key] = distances
+    return distances
@@ -12,6 +12,8 @@
 # Pieter Abbeel (pabbeel@cs.berkeley.edu).
 
 
+import heapq
+import random
 import re
 import testClasses
 import textwrap
@@ -19,6 +21,7 @@ import textwrap
 # import project specific code
 import layout
 import pacman
+import util
 from search import SearchProblem
 
 # helper function for printing solutions in solution files
@@ -819,3 +822,157 @@ class CornerHeuristicPacman(testClasses.TestCase):
         handle.close()
         return True
 
+
+# The tests below check fast paths in util, game and pacman against the code
+# they replaced.  They are not part of the project's grade; run them with
+#   python autograder.py --test-directory fastpath_test_cases
+
+class LinearScanPriorityQueue:
+    """
+      The util.PriorityQueue before decrease-key was indexed: update is a
+      linear scan of the heap followed by a full heapify.
+    """
+    def __init__(self):
+        self.heap = []
+        self.count = 0
+
+    def push(self, item, priority):
+        heapq.heappush(self.heap, (priority, self.count, item))
+        self.count += 1
+
+    def pop(self):
+        (_, _, item) = heapq.heappop(self.heap)
+        return item
+
+    def isEmpty(self):
+        return len(self.heap) == 0
+
+    def update(self, item, priority):
+        for index, (p, c, i) in enumerate(self.heap):
+            if i == item:
+                if p <= priority:
+                    break
+                del self.heap[index]
+                self.heap.append((priority, c, item))
+                heapq.heapify(self.heap)
+                break
+        else:
+            self.push(item, priority)
+
+def playRandomGame(lay, seed, turns):
+    """
+    Plays random legal moves for every agent on lay, for at most turns moves.
+    Returns the list of (state, agentIndex) for every non-terminal state visited.
+    """
+    rand = random.Random(seed)
+    state = pacman.GameState()
+    state.initialize(lay, lay.getNumGhosts())
+    visited = []
+    while len(visited) < turns and not (state.isWin() or state.isLose()):
+        agentIndex = len(visited) % state.getNumAgents()
+        visited.append((state, agentIndex))
+        state = state.generateSuccessor(agentIndex, rand.choice(state.getLegalActions(agentIndex)))
+    return visited
+
+
+class PriorityQueueOrderTest(testClasses.TestCase):
+
+    def __init__(self, question, testDict):
+        super(PriorityQueueOrderTest, self).__init__(question, testDict)
+        self.seed = int(testDict['seed'])
+        self.operations = int(testDict['operations'])
+        self.items = int(testDict['items'])
+        self.maxPriority = int(testDict['maxPriority'])
+        self.hashable = testDict.get('hashable', 'True') == 'True'
+
+    def execute(self, grades, moduleDict, solutionDict):
+        queues = [util.PriorityQueue(), LinearScanPriorityQueue()]
+        popped = [[], []]
+        rand = random.Random(self.seed)
+        for operation in range(self.operations):
+            if rand.random() < 0.3 and not queues[1].isEmpty():
+                for queue, items in zip(queues, popped):
+                    items.append(queue.pop())
+            else:
+                item = rand.randrange(self.items)
+                if not self.hashable:
+                    item = [item]
+                priority = rand.randrange(self.maxPriority)
+                for queue in queues:
+                    queue.update(item, priority)
+            if queues[0].isEmpty() != queues[1].isEmpty():
+                self.addMessage('isEmpty() differs after %d operations' % (operation + 1))
+                return self.testFail(grades)
+        for queue, items in zip(queues, popped):
+            while not queue.isEmpty():
+                items.append(queue.pop())
+        if popped[0] != popped[1]:
+            self.addMessage('popped:             %s' % popped[0][:20])
+            self.addMessage('linear scan popped: %s' % popped[1][:20])
+            return self.testFail(grades)
+        self.addMessage('%d items popped in the same order as the linear scan queue' % len(popped[0]))
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+
+class ZobristHashTest(testClasses.TestCase):
+
+    def __init__(self, question, testDict):
+        super(ZobristHashTest, self).__init__(question, testDict)
+        self.layoutName = testDict['layoutName']
+        self.seed = int(testDict['seed'])
+        self.turns = int(testDict['turns'])
+
+    def execute(self, grades, moduleDict, solutionDict):
+        visited = playRandomGame(layout.getLayout(self.layoutName), self.seed, self.turns)
+        for turn, (state, agentIndex) in enumerate(visited):
+            if state.data.getZobristHash() != state.data.computeZobristHash():
+                self.addMessage('incremental hash differs from a fresh one after %d moves' % turn)
+                return self.testFail(grades)
+        self.addMessage('incremental hash matched a fresh one in %d states' % len(visited))
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True
+
+
+class CopyOnWriteTest(testClasses.TestCase):
+
+    def __init__(self, question, testDict):
+        super(CopyOnWriteTest, self).__init__(question, testDict)
+        self.layoutName = testDict['layoutName']
+        self.seed = int(testDict['seed'])
+        self.turns = int(testDict['turns'])
+
+    def execute(self, grades, moduleDict, solutionDict):
+        visited = playRandomGame(layout.getLayout(self.layoutName), self.seed, self.turns)
+        for turn, (state, agentIndex) in enumerate(visited):
+            # Successors share the parent's food, capsules and agent states
+            # until they change them; a deep copy shares nothing
+            original = state.deepCopy()
+            originalHash = state.data.getZobristHash()
+            for action in state.getLegalActions(agentIndex):
+                state.generateSuccessor(agentIndex, action)
+            if not state == original or state.data.getZobristHash() != originalHash or \
+                    state.getFood().count() != original.getFood().count():
+                self.addMessage('generating successors changed the state after %d moves' % turn)
+                return self.testFail(grades)
+        self.addMessage('no successor changed its parent in %d states' % len(visited))
+        return self.testPass(grades)
+
+    def writeSolution(self, moduleDict, filePath):
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        handle.write('# File intentionally blank.\n')
+        handle.close()
+        return True